@@ -0,0 +1,242 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import copy
+import functools
+import inspect
+
+import numpy as np
+
+import WADI.removal_functions as rf
+from WADI.removal_functions import MicrobialRemoval
+from WADI.removal_results import RemovalResults, flowline_codes
+
+# Porewater velocity [m/d] of the diffusion related attachment term: as in
+# 'calc_advective_microbial_removal', the default v_por of 'calc_lambda'
+K_DIFF_V_POR = inspect.signature(MicrobialRemoval.calc_lambda).parameters['v_por'].default
+
+# Intermediate terms of the advective microbial removal (BTO2012.015: Ch 6.7),
+# in order of evaluation: (term, input terms, function). The functions are
+# the ones used by 'MicrobialRemoval.calc_lambda'.
+REMOVAL_TERMS = (
+    ('alpha', ('alpha0', 'pH', 'pH0'), rf.calc_alpha),
+    ('k_coll', ('por_eff', 'grainsize', 'alpha'), rf.calc_k_coll),
+    ('As_happ', ('por_eff',), rf.calc_As_happ),
+    ('mu', ('rho_water', 'temp_water'), rf.calc_viscosity),
+    ('D_BM', ('temp_water', 'organism_diam', 'mu'), rf.calc_D_BM),
+    ('v_por', ('distance_traveled', 'traveltime'), rf.calc_porewater_velocity),
+    ('k_diff', ('D_BM', 'grainsize', 'por_eff'),
+        functools.partial(rf.calc_k_diff, v_por = K_DIFF_V_POR)),
+    ('k_att', ('k_coll', 'As_happ', 'k_diff'), rf.calc_k_att),
+    ('mu1_temp', ('mu1', 'temp_water', 'mu1_temp_ref', 'mu1_Q10'),
+        MicrobialRemoval.calc_mu1_temp),
+    ('lamda', ('k_att', 'mu1_temp'), rf.calc_lamda),
+    ('C_final', ('conc_start', 'conc_gw', 'lamda', 'v_por', 'distance_traveled'),
+        rf.calc_C_final),
+)
+
+# Flowline inputs (with the defaults of 'calc_advective_microbial_removal')
+FLOWLINE_INPUTS = {'grainsize': 0.00025, 'temp_water': 11., 'rho_water': 999.703,
+                   'pH': 7.5, 'por_eff': 0.33, 'conc_start': 1., 'conc_gw': 0.,
+                   'distance_traveled': 1., 'traveltime': 100.}
+# Organism inputs, defaulting to the (redox dependent) removal parameters
+ORGANISM_INPUTS = ('mu1', 'alpha0', 'pH0', 'organism_diam', 'mu1_temp_ref', 'mu1_Q10')
+
+
+class IncrementalMicrobialRemoval:
+    '''
+    Advective microbial removal for a batch of flowlines which keeps all
+    intermediate terms (alpha, k_coll, As_happ, mu, D_BM, v_por, k_diff,
+    k_att, mu1_temp, lamda, C_final). After a change of one or more inputs only the
+    dependent terms are recomputed, and only for the affected rows.
+
+    Attributes
+    ----------
+    mbo_removal: MicrobialRemoval
+        copy of the removal object with the (default) organism removal
+        parameters; 'set_removal_parameter' changes this copy only
+    redox: np.ndarray
+        redox condition per flowline ['suboxic','anoxic','deeply_anoxic']
+    values: dict
+        np.ndarray per input and intermediate term (one value per flowline)
+    last_recomputed: list
+        terms recomputed by the latest update
+    '''
+
+    def __init__(self, mbo_removal = 'carotovorum', redox = 'anoxic',
+                 mu1 = None, alpha0 = None, pH0 = None, organism_diam = None,
+                 mu1_temp_ref = None, mu1_Q10 = None, **flowline_inputs):
+        '''
+        Parameters
+        ----------
+        mbo_removal: MicrobialRemoval or str
+            removal object (or organism name) providing the removal parameters
+        redox: str or array_like
+            redox condition per flowline ['suboxic','anoxic','deeply_anoxic']
+        mu1, alpha0, pH0, organism_diam, mu1_temp_ref, mu1_Q10: float or array_like, optional
+            organism parameters overriding the removal parameters
+        **flowline_inputs: float or array_like
+            grainsize, temp_water, rho_water, pH, por_eff, conc_start, conc_gw,
+            distance_traveled, traveltime (see 'calc_advective_microbial_removal')
+        '''
+        if not isinstance(mbo_removal, MicrobialRemoval):
+            mbo_removal = MicrobialRemoval(organism = mbo_removal)
+        # own copy: changed removal parameters do not affect the caller's object
+        self.mbo_removal = copy.deepcopy(mbo_removal)
+
+        unknown = set(flowline_inputs) - set(FLOWLINE_INPUTS)
+        if unknown:
+            raise ValueError("Unknown flowline input(s): " + ", ".join(sorted(unknown)))
+        inputs = dict(FLOWLINE_INPUTS, **flowline_inputs)
+        organism_inputs = {'mu1': mu1, 'alpha0': alpha0, 'pH0': pH0,
+                           'organism_diam': organism_diam,
+                           'mu1_temp_ref': mu1_temp_ref, 'mu1_Q10': mu1_Q10}
+
+        shape = np.broadcast_shapes(np.shape(redox),
+                                    *[np.shape(v) for v in inputs.values()],
+                                    *[np.shape(v) for v in organism_inputs.values()
+                                      if v is not None])
+        if len(shape) > 1:
+            raise ValueError("Flowline inputs should be scalars or 1D arrays")
+        self.n_flowlines = shape[0] if shape else 1
+
+        self.redox = np.broadcast_to(np.asarray(redox, dtype = object),
+                                     (self.n_flowlines,)).copy()
+        self.values = {name: np.broadcast_to(np.asarray(value, dtype = float),
+                                             (self.n_flowlines,)).copy()
+                       for name, value in inputs.items()}
+
+        # Rows of which the organism parameters follow the removal parameters
+        self._from_database = {}
+        for name, value in organism_inputs.items():
+            if value is None:
+                self.values[name] = self._database_values(name, slice(None))
+                self._from_database[name] = np.ones(self.n_flowlines, dtype = bool)
+            else:
+                self.values[name] = np.broadcast_to(np.asarray(value, dtype = float),
+                                                    (self.n_flowlines,)).copy()
+                self._from_database[name] = np.zeros(self.n_flowlines, dtype = bool)
+
+        self.last_recomputed = []
+        self._recompute(set(self.values), slice(None))
+
+    @property
+    def lamda(self):
+        ''' Removal coefficient lambda [day-1] per flowline. '''
+        return self.values['lamda']
+
+    @property
+    def k_att(self):
+        ''' Attachment coefficient [day-1] per flowline. '''
+        return self.values['k_att']
+
+    @property
+    def C_final(self):
+        ''' Final concentration per flowline. '''
+        return self.values['C_final']
+
+    def to_results(self, flowline_id = None):
+        ''' Current results as a RemovalResults store. '''
+        results = RemovalResults.empty(self.n_flowlines)
+        if flowline_id is not None:
+            results.columns['flowline_id'][:], results.flowline_labels = \
+                flowline_codes(flowline_id)
+        results.fill(slice(None), self.mbo_removal.organism_name, self.redox,
+                     self.k_att, self.lamda, self.C_final, self.values['traveltime'],
+                     conc_start = self.values['conc_start'], conc_gw = self.values['conc_gw'])
+        return results
+
+    def update(self, rows = None, **changes):
+        ''' Change one or more inputs and recompute the dependent terms.
+
+            Parameters
+            -----------
+            rows: int, slice, array_like of int or bool, optional
+                flowlines to which the change applies (default: all)
+
+            **changes: float or array_like
+                new value(s) per input, e.g. pH = 7.2 or redox = 'suboxic';
+                organism parameters set this way no longer follow the
+                removal parameters of 'mbo_removal'
+
+            Returns
+            --------
+                list of the recomputed terms
+        '''
+        rows = slice(None) if rows is None else rows
+        changed = set()
+        for name, value in changes.items():
+            if name == 'redox':
+                self.redox[rows] = value
+                # organism parameters follow the new redox zone
+                for organism_input, from_database in self._from_database.items():
+                    if type(self.mbo_removal.removal_parameters[organism_input]) is not dict:
+                        continue
+                    select = self._select(rows)[from_database[rows]]
+                    self.values[organism_input][select] = \
+                        self._database_values(organism_input, select)
+                    changed.add(organism_input)
+            elif name in FLOWLINE_INPUTS or name in ORGANISM_INPUTS:
+                self.values[name][rows] = value
+                if name in ORGANISM_INPUTS:
+                    self._from_database[name][rows] = False
+                changed.add(name)
+            else:
+                raise ValueError("'%s' is not an input of the removal calculation" % name)
+
+        return self._recompute(changed, rows)
+
+    def set_removal_parameter(self, parameter, value, redox = None):
+        ''' Change an organism removal parameter (e.g. 'alpha0' of the
+            'suboxic' zone) and recompute the rows that use it.
+
+            Parameters
+            -----------
+            parameter: str
+                'alpha0', 'pH0', 'mu1', 'organism_diam', 'mu1_temp_ref' or 'mu1_Q10'
+
+            value: float
+                new value of the parameter
+
+            redox: str
+                redox zone of the parameter ('alpha0', 'pH0' and 'mu1' only)
+
+            Returns
+            --------
+                list of the recomputed terms
+        '''
+        if type(self.mbo_removal.removal_parameters[parameter]) is not dict:
+            self.mbo_removal.removal_parameters[parameter] = value
+            rows = self._from_database[parameter]
+        else:
+            self.mbo_removal.removal_parameters[parameter][redox] = value
+            rows = self._from_database[parameter] & (self.redox == redox)
+        rows = np.flatnonzero(rows)
+        self.values[parameter][rows] = value
+        return self._recompute({parameter}, rows)
+
+    def _select(self, rows):
+        return np.arange(self.n_flowlines)[rows]
+
+    def _database_values(self, name, rows):
+        value = self.mbo_removal.removal_parameters[name]
+        if type(value) is not dict:
+            return np.full(len(self._select(rows)), np.nan if value is None else value)
+        return self.mbo_removal.redox_parameter(name, self.redox[rows])
+
+    def _recompute(self, changed, rows):
+        dirty = set(changed)
+        recomputed = []
+        for term, inputs, function in REMOVAL_TERMS:
+            if dirty.isdisjoint(inputs):
+                continue
+            result = function(*[self.values[name][rows] for name in inputs])
+            if term in self.values:
+                self.values[term][rows] = result
+            else:
+                self.values[term] = np.broadcast_to(result, (self.n_flowlines,)).copy()
+            dirty.add(term)
+            recomputed.append(term)
+        self.last_recomputed = recomputed
+        return recomputed
@@ -0,0 +1,256 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from WADI.removal_functions import MicrobialRemoval
+from WADI.removal_results import calc_log_removal
+
+
+# Philox4x32 multipliers and Weyl key increments (Salmon et al., 2011)
+PHILOX_M = (np.uint64(0xD2511F53), np.uint64(0xCD9E8D57))
+PHILOX_W = (np.uint64(0x9E3779B9), np.uint64(0xBB67AE85))
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def philox4x32(counter, key, rounds = 10):
+    ''' Counter-based random numbers: the Philox4x32 bijection of 'counter'
+        under 'key', evaluated for all counters at once.
+
+        Parameters
+        -----------
+        counter: array_like of uint32
+            counters, shape (4, ...)
+        key: array_like of uint32
+            key, shape (2,) or (2, ...) broadcasting with the counters
+
+        Returns
+        --------
+            random 32-bit words (as uint64), shape of 'counter'
+    '''
+    c0, c1, c2, c3 = np.asarray(counter, dtype = np.uint64) & _MASK32
+    k0, k1 = np.asarray(key, dtype = np.uint64) & _MASK32
+    for _ in range(rounds):
+        # 32 x 32 -> 64 bit products: high and low words
+        p0 = PHILOX_M[0] * c0
+        p1 = PHILOX_M[1] * c2
+        c0, c1, c2, c3 = ((p1 >> np.uint64(32)) ^ c1 ^ k0, p1 & _MASK32,
+                          (p0 >> np.uint64(32)) ^ c3 ^ k1, p0 & _MASK32)
+        k0 = (k0 + PHILOX_W[0]) & _MASK32
+        k1 = (k1 + PHILOX_W[1]) & _MASK32
+    return np.stack([c0, c1, c2, c3])
+
+
+def sample_uniform(seed, row_id, n_pairs):
+    ''' Pairs of uniform [0, 1) samples per row: Philox4x32 keyed by 'seed'
+        with the row ID and sample index as counter, so the random numbers of
+        a row do not depend on how the rows are split over chunks or workers.
+
+        Returns
+        --------
+            two arrays of shape (n_rows, n_pairs)
+    '''
+    seed = int(seed)
+    if seed < 0 or seed >= 2**64:
+        raise ValueError("The seed should be a non-negative 64-bit integer")
+    row_id = np.asarray(row_id, dtype = np.uint64)[:, None]
+    index = np.arange(n_pairs, dtype = np.uint64)[None, :]
+    counter = (index, index >> np.uint64(32), row_id, row_id >> np.uint64(32))
+    counter = np.broadcast_arrays(*counter)
+    words = philox4x32(counter, (seed & 0xFFFFFFFF, seed >> 32))
+    # 53 random bits per double
+    u0 = ((words[0] >> np.uint64(5)) * 67108864. + (words[1] >> np.uint64(6))) / 2.**53
+    u1 = ((words[2] >> np.uint64(5)) * 67108864. + (words[3] >> np.uint64(6))) / 2.**53
+    return u0, u1
+
+
+def sample_normal(seed, row_id, mean, std, n_samples):
+    ''' Normally distributed samples per row (Box-Muller transform of
+        'sample_uniform'), evaluated for all rows at once.
+
+        Parameters
+        -----------
+        seed: int
+            seed of the run (non-negative)
+        row_id: array_like of int
+            (non-negative) row IDs, shape (n_rows,)
+        mean, std: float or array_like
+            mean and standard deviation per row
+        n_samples: int
+            number of samples per row
+
+        Returns
+        --------
+            samples, shape (n_rows, n_samples)
+    '''
+    row_id = np.asarray(row_id)
+    u0, u1 = sample_uniform(seed, row_id, (n_samples + 1) // 2)
+    radius = np.sqrt(-2. * np.log1p(-u0))
+    standard_normal = np.concatenate([radius * np.cos(2. * np.pi * u1),
+                                      radius * np.sin(2. * np.pi * u1)],
+                                     axis = 1)[:, :n_samples]
+    mean = np.broadcast_to(mean, row_id.shape)[:, None]
+    std = np.broadcast_to(std, row_id.shape)[:, None]
+    return mean + std * standard_normal
+
+
+def exact_sum(values, axis = None):
+    ''' Correctly rounded sum (math.fsum), independent of the order of the
+        values, e.g. to combine results of chunks or workers. '''
+    values = np.asarray(values, dtype = float)
+    if axis is None:
+        return math.fsum(values.ravel())
+    return np.apply_along_axis(math.fsum, axis, values)
+
+
+def monte_carlo_microbial_removal(row_id, organism = 'carotovorum', seed = 0,
+                                  n_samples = 1000, mu1_std = 0.0932,
+                                  percentiles = (5., 50., 95.),
+                                  **flowline_inputs):
+    ''' Monte Carlo advective microbial removal with a normally distributed
+        inactivation coefficient mu1 (negative samples clipped to 0) per
+        flowline.
+
+        Parameters
+        -----------
+        row_id: array_like of int
+            flowline IDs (keys of the random streams), shape (n_rows,)
+        organism: str or MicrobialRemoval
+            organism (or removal object) of the flowlines
+        seed: int
+            seed of the run
+        n_samples: int
+            number of samples per flowline
+        mu1_std: float or array_like
+            standard deviation of mu1 [day-1]
+        percentiles: tuple of float
+            percentiles of C_final over the samples to return
+        **flowline_inputs: float or array_like
+            inputs of 'calc_advective_microbial_removal' per flowline
+            (incl. 'redox'), shape (n_rows,); 'mu1' defaults to the
+            removal parameters of the organism
+
+        Returns
+        --------
+            dict with per flowline 'C_final_mean', 'log_removal_mean' and
+            'C_final_p<q>' for each percentile q
+    '''
+    row_id = np.asarray(row_id)
+    mbo_removal = organism if isinstance(organism, MicrobialRemoval) \
+        else MicrobialRemoval(organism = organism)
+
+    redox = flowline_inputs.pop('redox', 'anoxic')
+    redox = np.broadcast_to(np.asarray(redox, dtype = object), row_id.shape)
+    mu1 = flowline_inputs.pop('mu1', None)
+    if mu1 is None:
+        mu1 = mbo_removal.redox_parameter('mu1', redox)
+    mu1 = np.maximum(sample_normal(seed, row_id, mu1, mu1_std, n_samples), 0.)
+
+    # flowlines along the first axis, samples along the second
+    kwargs = {name: np.asarray(value)[:, None] if np.ndim(value) else value
+              for name, value in flowline_inputs.items()}
+    C_final = mbo_removal.calc_advective_microbial_removal(redox = redox[:, None],
+                                                           mu1 = mu1, **kwargs)
+    C_final = np.broadcast_to(C_final, mu1.shape)
+    log_removal = np.broadcast_to(calc_log_removal(mbo_removal.lamda,
+                                                   kwargs.get('traveltime', 100.), C_final,
+                                                   kwargs.get('conc_start', 1.),
+                                                   kwargs.get('conc_gw', 0.)), mu1.shape)
+
+    results = {"C_final_mean": C_final.mean(axis = 1),
+               "log_removal_mean": log_removal.mean(axis = 1)}
+    for q, values in zip(percentiles, np.percentile(C_final, percentiles, axis = 1)):
+        results["C_final_p%g" % q] = values
+    return results
+
+
+def _run_chunk(function, row_id, chunk_inputs, kwargs):
+    return function(row_id, **chunk_inputs, **kwargs)
+
+
+def run_chunked(function, flowlines, chunk_size = 10000, n_workers = 1,
+                row_id = None, **kwargs):
+    ''' Run 'function' over the flowlines in chunks, optionally in parallel
+        processes, and reassemble the results in row order.
+
+        The results are identical for any chunk size and number of workers
+        as long as 'function' computes every row independently (e.g. with
+        random numbers from 'sample_uniform' or 'sample_normal'); reductions over rows should be
+        done on the reassembled results (or with 'exact_sum').
+
+        Parameters
+        -----------
+        function: callable
+            function(row_id, **chunk_inputs, **kwargs) returning a dict of
+            arrays with the rows along the first axis; must be picklable
+            (module level) if n_workers > 1
+        flowlines: dict
+            flowline inputs, arrays of shape (n_rows,) or scalars
+        chunk_size: int
+            number of rows per chunk
+        n_workers: int
+            number of worker processes (1: run in this process)
+        row_id: array_like of int, optional
+            row IDs (default: 0, 1, 2, ...)
+        **kwargs:
+            passed to 'function' unchanged
+
+        Returns
+        --------
+            dict of arrays with the results of all rows
+    '''
+    shape = np.broadcast_shapes(*[np.shape(value) for value in flowlines.values()])
+    n_rows = len(row_id) if row_id is not None else (shape[0] if shape else 1)
+    row_id = np.arange(n_rows) if row_id is None else np.asarray(row_id)
+
+    chunks = []
+    for start in range(0, n_rows, chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk_inputs = {name: np.asarray(value)[rows] if np.ndim(value) else value
+                        for name, value in flowlines.items()}
+        chunks.append((function, row_id[rows], chunk_inputs, kwargs))
+
+    if n_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers = n_workers) as executor:
+            # map keeps the order of the chunks
+            results = list(executor.map(_run_chunk, *zip(*chunks)))
+    else:
+        results = [_run_chunk(*chunk) for chunk in chunks]
+
+    if not results:
+        return {}
+    return {name: np.concatenate([res[name] for res in results]) for name in results[0]}
+
+
+def check_chunk_invariance(function, flowlines, chunk_sizes = (1, 7, 1000),
+                           n_workers = (1, 2), **kwargs):
+    ''' Test harness: run 'function' with 'run_chunked' for all combinations
+        of chunk size and number of workers and check that all results are
+        bitwise identical to a single chunk run.
+
+        Raises
+        -------
+            AssertionError naming the first chunk size/worker combination
+            (and result) that differs
+
+        Returns
+        --------
+            the reference results (single chunk, single worker)
+    '''
+    shape = np.broadcast_shapes(*[np.shape(value) for value in flowlines.values()])
+    n_rows = shape[0] if shape else 1
+    reference = run_chunked(function, flowlines, chunk_size = max(n_rows, 1),
+                            n_workers = 1, **kwargs)
+    for chunk_size in chunk_sizes:
+        for workers in n_workers:
+            results = run_chunked(function, flowlines, chunk_size = chunk_size,
+                                  n_workers = workers, **kwargs)
+            for name, values in reference.items():
+                if not np.array_equal(results[name], values, equal_nan = True):
+                    raise AssertionError("'%s' differs for chunk_size = %d, n_workers = %d"
+                                         % (name, chunk_size, workers))
+    return reference
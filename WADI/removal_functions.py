@@ -14,6 +14,104 @@ from datetime import timedelta
 
 path = os.getcwd()
 
+# Redox zones for which (microbial) removal parameters are defined
+REDOX_ZONES = ('suboxic', 'anoxic', 'deeply_anoxic')
+
+
+def redox_parameter(removal_parameters, parameter, redox = 'anoxic'):
+    ''' Look up a redox dependent removal parameter of an organism
+        ('alpha0', 'pH0', 'mu1') or a substance ('omp_half_life').
+
+        Parameters
+        -----------
+        removal_parameters: dict
+            removal parameters of the organism or substance, with a dict
+            per redox zone for the redox dependent parameters
+
+        parameter: str
+            name of the redox dependent removal parameter
+
+        redox: str or array_like
+            redox condition ['suboxic','anoxic','deeply_anoxic'],
+            either a single zone or one zone per flowline
+
+        Returns
+        --------
+            value of the parameter; a float array of the same shape as
+            'redox' if an array of redox zones is given (np.nan for
+            unknown zones or missing values)
+    '''
+    if np.ndim(redox) == 0:
+        return removal_parameters[parameter][redox]
+
+    redox = np.asarray(redox)
+    values = np.full(redox.shape, np.nan)
+    for zone, value in removal_parameters[parameter].items():
+        if value is not None:
+            values[redox == zone] = value
+    return values
+
+# Boltzmann coefficient [J K-1]
+const_BM = 1.38e-23
+
+
+#%% ----------------------------------------------------------------------------
+# Terms of the advective (microbial) removal, BTO2012.015: Ch 6.7 (page 71-74).
+# Shared by 'MicrobialRemoval.calc_lambda' and WADI.incremental_removal;
+# all terms accept floats or numpy arrays.
+# ------------------------------------------------------------------------------
+
+def calc_alpha(alpha0, pH, pH0):
+    ''' Sticky coefficient 'alpha' [-], corrected for pH. '''
+    return alpha0 * 0.9**((pH - pH0)/0.1)
+
+def calc_k_coll(por_eff, grainsize, alpha):
+    ''' Collision term 'k_coll'. '''
+    return (3/2.)*((1-por_eff) / grainsize) * alpha
+
+def calc_As_happ(por_eff):
+    ''' Happel's porosity dependent parameter 'A_s' (Eq. 5: BTO2012.015). '''
+    # Porosity dependent variable 'gamma'
+    gamma = (1-por_eff)**(1/3)
+    ''' !!! Use correct formula:-> As =  2 * (1-gamma**5) /  (2 - 3 * gamma + 3 * gamma**5 - 2 * gamma**6)
+        instead of... 2 * (1-gamma)**5 / (.......) 
+    '''
+    return 2 * (1-gamma**5) / \
+            (2 - 3 * gamma + 3 * gamma**5 - 2 * gamma**6)
+
+def calc_viscosity(rho_water, temp_water):
+    ''' Dynamic viscosity (mu) [kg m-1 s-1]. '''
+    return (rho_water * 497.e-6) / \
+                (temp_water + 42.5)**(3/2)
+
+def calc_D_BM(temp_water, organism_diam, mu):
+    ''' Diffusion constant 'D_BM' (Eq.6: BTO2012.015) [m2 d-1]. '''
+    # unit: [m2 s-1]
+    D_BM = (const_BM * (temp_water + 273.)) / \
+                (3 * np.pi * organism_diam * mu)
+    # unit: [m2 d-1]
+    return D_BM * 86400.
+
+def calc_porewater_velocity(distance_traveled, traveltime):
+    ''' Porewater velocity 'v_por' [m d-1]. '''
+    return distance_traveled / traveltime
+
+def calc_k_diff(D_BM, grainsize, por_eff, v_por):
+    ''' Diffusion related attachment term 'k_diff'. '''
+    return ((D_BM /
+                (grainsize * por_eff * v_por))**(2/3) * v_por)
+
+def calc_k_att(k_coll, As_happ, k_diff):
+    ''' 'attachment coefficient' k_att [day-1]. '''
+    return k_coll * 4 * As_happ**(1/3) * k_diff
+
+def calc_lamda(k_att, mu1):
+    ''' Removal coefficient 'lamda' [day-1]. '''
+    return k_att + mu1
+
+def calc_C_final(conc_start, conc_gw, lamda, v_por, distance_traveled):
+    ''' Concentration after advective removal over 'distance_traveled'. '''
+    return (conc_start - conc_gw) * np.exp(-(lamda/v_por)*distance_traveled) + conc_gw
 
 
 class Organism:
@@ -41,6 +139,11 @@ class Organism:
     'mu1': float
         inactivation coefficient [1/day]
         per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+    'mu1_temp_ref': float
+        reference water temperature of 'mu1' [degrees celcius]
+    'mu1_Q10': float
+        factor by which 'mu1' increases per 10 degrees temperature rise [-]
+        (None: no temperature correction of 'mu1')
     '''  
     def __init__(self, organism_name, 
                     removal_function = 'mbo'):
@@ -66,6 +169,10 @@ class Organism:
             'mu1': float
                 inactivation coefficient [1/day]
                 per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+            'mu1_temp_ref': float
+                reference water temperature of 'mu1' [degrees celcius]
+            'mu1_Q10': float
+                temperature coefficient of 'mu1' per 10 degrees [-]
 
         """
         self.organism_name = organism_name
@@ -89,7 +196,9 @@ class Organism:
                         "suboxic": 1.2472, 
                         "anoxic": 0.1151, 
                         "deeply_anoxic": 0.1151
-                    }
+                    },
+                    "mu1_temp_ref": None,   # NOT reported: no temperature correction
+                    "mu1_Q10": None
                 },
             "carotovorum": 
                 {"organism_name": "carotovorum",
@@ -108,7 +217,9 @@ class Organism:
                         "suboxic": 1.2664, 
                         "anoxic": 0.1279, 
                         "deeply_anoxic": 0.1279
-                    }
+                    },
+                    "mu1_temp_ref": None,   # NOT reported: no temperature correction
+                    "mu1_Q10": None
                 },
             "solanacearum": 
                 {"organism_name": "solanacearum",
@@ -127,7 +238,9 @@ class Organism:
                         "suboxic": 0.3519, 
                         "anoxic": 0.1637, 
                         "deeply_anoxic": 0.1637
-                    }
+                    },
+                    "mu1_temp_ref": None,   # NOT reported: no temperature correction
+                    "mu1_Q10": None
                 },
             }
 
@@ -151,7 +264,9 @@ class Organism:
                     "suboxic": None, 
                     "anoxic": None, 
                     "deeply_anoxic": None
-                     }
+                     },
+                 "mu1_temp_ref": None,
+                 "mu1_Q10": None
                 }
 
 class MicrobialRemoval():
@@ -173,6 +288,10 @@ class MicrobialRemoval():
             'mu1': float
                 inactivation coefficient [1/day]
                 per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+            'mu1_temp_ref': float
+                reference water temperature of 'mu1' [degrees celcius]
+            'mu1_Q10': float
+                temperature coefficient of 'mu1' per 10 degrees [-]
     '''
 
     def __init__(self,
@@ -187,6 +306,8 @@ class MicrobialRemoval():
                 mu1_anoxic=None,
                 mu1_deeply_anoxic=None,
                 organism_diam=None,
+                mu1_temp_ref=None,
+                mu1_Q10=None,
                 ):
         '''
         Initialization of the MicrobialRemoval class, checks for user-defined 
@@ -207,6 +328,10 @@ class MicrobialRemoval():
             per redox zone ('suboxic', 'anoxic', deeply_anoxic')
         organism_diam: float
             diameter of pathogen/species [m]
+        mu1_temp_ref: float
+            reference water temperature of 'mu1' [degrees celcius]
+        mu1_Q10: float
+            factor by which 'mu1' increases per 10 degrees temperature rise [-]
         '''
 
         # Organism
@@ -221,6 +346,8 @@ class MicrobialRemoval():
         self.mu1_anoxic=mu1_anoxic
         self.mu1_deeply_anoxic=mu1_deeply_anoxic
         self.organism_diam=organism_diam        
+        self.mu1_temp_ref=mu1_temp_ref
+        self.mu1_Q10=mu1_Q10
 
         # Create user dict with 'removal_parameters' from input
         user_removal_parameters = {
@@ -241,7 +368,9 @@ class MicrobialRemoval():
                         "suboxic": self.mu1_suboxic, 
                         "anoxic": self.mu1_anoxic, 
                         "deeply_anoxic": self.mu1_deeply_anoxic
-                    }
+                    },
+                    "mu1_temp_ref": self.mu1_temp_ref,
+                    "mu1_Q10": self.mu1_Q10
                 },
             }
 
@@ -272,6 +401,50 @@ class MicrobialRemoval():
         #assign updated dict as attribute of the class to be able to access later
         self.removal_parameters = user_removal_parameters
         
+    def redox_parameter(self, parameter, redox = 'anoxic'):
+        ''' Look up a redox dependent removal parameter of the organism
+            ['alpha0','pH0','mu1'] (see 'redox_parameter' of this module). '''
+        return redox_parameter(self.removal_parameters, parameter, redox)
+
+    @staticmethod
+    def calc_mu1_temp(mu1 = 0.149, temp_water = 10.,
+                mu1_temp_ref = None, mu1_Q10 = None):
+        ''' Correct the inactivation coefficient mu1 for the water temperature
+            (Q10 approach):
+
+            mu1(T) = mu1 * Q10 ** ((T - T_ref) / 10)
+
+            Parameters
+            -----------
+            mu1: float
+                inactivation coefficient at the reference temperature [day-1]
+
+            temp_water: float
+                Water temperature [degrees celcius]
+
+            mu1_temp_ref: float
+                reference water temperature of mu1 [degrees celcius]
+
+            mu1_Q10: float
+                factor by which mu1 increases per 10 degrees temperature rise [-]
+
+            No correction is applied if mu1_temp_ref or mu1_Q10 is None (or NaN
+            for array input). All parameters may be numpy arrays, e.g. a daily
+            temperature series of shape (n_days, 1) with flowline parameters
+            of shape (n_flowlines,).
+
+            Returns
+            --------
+                temperature corrected mu1 [day-1]
+        '''
+        if mu1_temp_ref is None or mu1_Q10 is None:
+            return mu1
+
+        factor = np.power(mu1_Q10, (np.asarray(temp_water) - mu1_temp_ref) / 10.)
+        if np.ndim(factor) == 0:
+            return mu1 * float(factor) if not np.isnan(factor) else mu1
+        return mu1 * np.where(np.isnan(factor), 1., factor)
+
     def calc_lambda(self, redox = 'anoxic',
                 mu1 = 0.149, mu1_std = 0.0932,
                 por_eff = 0.33,
@@ -281,7 +454,8 @@ class MicrobialRemoval():
                 rho_water = 999.703,
                 alpha0 = 0.001,
                 pH0 = 7.5,
-                organism_diam = 2.33e-8, v_por = 0.01):
+                organism_diam = 2.33e-8, v_por = 0.01,
+                mu1_temp_ref = None, mu1_Q10 = None):
         
         ''' For more information about the advective microbial removal calculation: 
             BTO2012.015: Ch 6.7 (page 71-74)
@@ -296,6 +470,10 @@ class MicrobialRemoval():
             
             mu1: float
                 inactivation coefficient [day-1]
+
+            mu1_temp_ref, mu1_Q10: float
+                reference temperature [degrees celcius] and Q10 [-] of mu1,
+                see 'calc_mu1_temp' (None: no temperature correction)
             
             por_eff: float
                 effective porosity [-]
@@ -346,44 +524,32 @@ class MicrobialRemoval():
 
         '''
 
-        # Boltzmann coefficient [J K-1]
-        const_BM = 1.38e-23    
-
         # Sticky coefficient
-        alpha = alpha0 * 0.9**((pH - pH0)/0.1)
+        alpha = calc_alpha(alpha0, pH, pH0)
 
         # Collision term 'k_coll'
-        k_coll = (3/2.)*((1-por_eff) / grainsize) * alpha
-
-        # Porosity dependent variable 'gamma'
-        gamma = (1-por_eff)**(1/3)
+        k_coll = calc_k_coll(por_eff, grainsize, alpha)
 
-        # Calculate Happel’s porosity dependent parameter 'A_s' (Eq. 5: BTO2012.015)
-        ''' !!! Use correct formula:-> As =  2 * (1-gamma**5) /  (2 - 3 * gamma + 3 * gamma**5 - 2 * gamma**6)
-            instead of... 2 * (1-gamma)**5 / (.......) 
-        '''
-        As_happ = 2 * (1-gamma**5) / \
-                (2 - 3 * gamma + 3 * gamma**5 - 2 * gamma**6)
+        # Happel's porosity dependent parameter 'A_s' (Eq. 5: BTO2012.015)
+        As_happ = calc_As_happ(por_eff)
 
         # Dynamic viscosity (mu) [kg m-1 s-1]
-        mu = (rho_water * 497.e-6) / \
-                    (temp_water + 42.5)**(3/2)
+        mu = calc_viscosity(rho_water, temp_water)
 
-
-        # Diffusion constant 'D_BM' (Eq.6: BTO2012.015) --> unit: [m2 s-1]
-        D_BM = (const_BM * (temp_water + 273.)) / \
-                    (3 * np.pi * organism_diam * mu)
-        # Diffusieconstante 'D_BM' (Eq.6: BTO2012.015) --> unit: [m2 d-1]
-        D_BM *= 86400.
+        # Diffusion constant 'D_BM' (Eq.6: BTO2012.015) --> unit: [m2 d-1]
+        D_BM = calc_D_BM(temp_water, organism_diam, mu)
 
         # Diffusion related attachment term 'k_diff'
-        k_diff = ((D_BM /
-                    (grainsize * por_eff * v_por))**(2/3) * v_por)
+        k_diff = calc_k_diff(D_BM, grainsize, por_eff, v_por)
 
         # 'attachment coefficient' [day-1]
-        k_att = k_coll * 4 * As_happ**(1/3) * k_diff
+        k_att = calc_k_att(k_coll, As_happ, k_diff)
+        # inactivation coefficient at the water temperature [day-1]
+        self.mu1_temp = self.calc_mu1_temp(mu1 = mu1, temp_water = temp_water,
+                                           mu1_temp_ref = mu1_temp_ref,
+                                           mu1_Q10 = mu1_Q10)
         # removal coefficient 'lamda' [lambda: day-1], using 'mu1' mean.
-        lamda = k_att + mu1
+        lamda = calc_lamda(k_att, self.mu1_temp)
 
         return lamda, k_att
     
@@ -394,7 +560,8 @@ class MicrobialRemoval():
                                         redox = 'anoxic',
                                         distance_traveled = 1., traveltime = 100.,
                                         mu1 = None, alpha0 = None, pH0 = None,
-                                        organism_diam = None):
+                                        organism_diam = None,
+                                        mu1_temp_ref = None, mu1_Q10 = None):
         ''' Calculate the advective microbial removal of microbial organisms
             from source to end_point.
 
@@ -406,11 +573,15 @@ class MicrobialRemoval():
             lambda: float
                 'removal rate' [day-1] (redox dependent) --> calculated
             
-            redox: str
+            redox: str or array_like
                 redox condition ['suboxic','anoxic','deeply_anoxic']
             
             mu1: float
                 inactivation coefficient [day-1]
+
+            mu1_temp_ref, mu1_Q10: float
+                reference temperature [degrees celcius] and Q10 [-] of mu1,
+                see 'calc_mu1_temp' (None: no temperature correction)
             
             por_eff: float
                 effective porosity [-]
@@ -459,6 +630,11 @@ class MicrobialRemoval():
 
             C_final: float
                 final concentration [N/L]
+
+            All numerical parameters (and 'redox') may also be given as
+            numpy arrays of equal (or broadcastable) shape, in which case
+            C_final, lamda and k_att are evaluated for all flowlines at once
+            (see also 'calc_seasonal_microbial_removal').
             
             Returns
             --------
@@ -468,22 +644,28 @@ class MicrobialRemoval():
 
         # mu1 [day -1]
         if mu1 is None:
-            mu1 = self.removal_parameters['mu1'][redox]
+            mu1 = self.redox_parameter('mu1', redox)
 
         # alpha0 [-]
         if alpha0 is None:
-            alpha0 = self.removal_parameters['alpha0'][redox]
+            alpha0 = self.redox_parameter('alpha0', redox)
 
         # reference pH [-]
         if pH0 is None:
-            pH0 = self.removal_parameters['pH0'][redox]
+            pH0 = self.redox_parameter('pH0', redox)
 
         # organism diameter [m]
         if organism_diam is None:
             organism_diam = self.removal_parameters['organism_diam']
 
+        # temperature dependence of mu1
+        if mu1_temp_ref is None:
+            mu1_temp_ref = self.removal_parameters['mu1_temp_ref']
+        if mu1_Q10 is None:
+            mu1_Q10 = self.removal_parameters['mu1_Q10']
+
         # porewater_velocity
-        v_por = distance_traveled / traveltime
+        v_por = calc_porewater_velocity(distance_traveled, traveltime)
 
         # Calculate removal coefficient lambda [day -1]
         self.lamda, self.k_att = self.calc_lambda(redox = redox, mu1 = mu1,
@@ -493,11 +675,328 @@ class MicrobialRemoval():
                                     rho_water = rho_water,
                                     alpha0 = alpha0, 
                                     pH0 = pH0,
-                                    organism_diam = organism_diam)
+                                    organism_diam = organism_diam,
+                                    mu1_temp_ref = mu1_temp_ref,
+                                    mu1_Q10 = mu1_Q10)
 
         # Calculate concentration after microbial removal in subsurface
-        C_final = (conc_start - conc_gw) * np.exp(-(self.lamda/v_por)*distance_traveled) + conc_gw
+        C_final = calc_C_final(conc_start, conc_gw, self.lamda, v_por, distance_traveled)
+
+
+        # return final concentration 'C_final'
+        return C_final
+
+    def calc_seasonal_microbial_removal(self, temp_water, **flowline_parameters):
+        ''' Calculate the advective microbial removal for a (daily) water
+            temperature series over a set of flowlines in one batched call.
+
+            Parameters
+            -----------
+            temp_water: array_like or pandas.Series
+                Water temperature per time step [degrees celcius], shape (n_days,)
+
+            **flowline_parameters: float or array_like
+                parameters of 'calc_advective_microbial_removal' (incl. 'redox'),
+                scalars or arrays of shape (n_flowlines,)
+
+            Calculates
+            -----------
+            lamda, k_att, mu1_temp: np.ndarray
+                per time step and flowline, shape (n_days, n_flowlines)
+
+            Returns
+            --------
+                C_final, shape (n_days, n_flowlines)
+        '''
+        if 'temp_water' in flowline_parameters:
+            raise ValueError("Use the 'temp_water' argument for the temperature series")
+        # time steps along the first axis, flowlines along the second
+        temp_water = np.asarray(temp_water, dtype = float).reshape(-1, 1)
+        flowline_parameters = {name: np.atleast_1d(value) if np.ndim(value) else value
+                               for name, value in flowline_parameters.items()}
+
+        C_final = self.calc_advective_microbial_removal(temp_water = temp_water,
+                                                        **flowline_parameters)
+        shape = np.broadcast_shapes(np.shape(C_final), (len(temp_water), 1))
+        return np.broadcast_to(C_final, shape)
+
+
+class Substance:
+    ''' 
+    Placeholder class which includes removal parameters for
+    a selection of organic micropollutants ('omp'). For now dictionary includes 
+    'benzene', 'benzo(a)pyrene' and 'AMPA'.
+
+    Attributes
+    ---------
+    substance_name: String
+        name of the substance 
+
+    'log_Koc': float
+        log of the organic carbon - water partitioning coefficient [L/kg]
+    'omp_half_life': float
+        half-life time of the substance [days]
+        per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+        (1e99: no degradation)
+    '''  
+    def __init__(self, substance_name, 
+                    removal_function = 'omp'):
+        """
+        Parameters
+        ----------
+
+        substance_name: str
+            name of the substance (for now limited dictionary to 
+            'benzene', 'benzo(a)pyrene', 'AMPA')
+
+        Returns
+        --------
+        substance_dict: dictionary
+            'log_Koc': float
+                log of the organic carbon - water partitioning coefficient [L/kg]
+            'omp_half_life': float
+                half-life time of the substance [days]
+                per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+        """
+        self.substance_name = substance_name
+
+        substance_dict = {
+            "benzene": 
+                {"substance_name": "benzene",
+                    "log_Koc": 1.92,
+                    "omp_half_life": {
+                        "suboxic": 10.5, 
+                        "anoxic": 420, 
+                        "deeply_anoxic": 1e99
+                    }
+                },
+            "benzo(a)pyrene": 
+                {"substance_name": "benzo(a)pyrene",
+                    "log_Koc": 6.43,
+                    "omp_half_life": {
+                        "suboxic": 530, 
+                        "anoxic": 2120, 
+                        "deeply_anoxic": 2120
+                    }
+                },
+            "AMPA": 
+                {"substance_name": "AMPA",
+                    "log_Koc": -0.36,
+                    "omp_half_life": {
+                        "suboxic": 46, 
+                        "anoxic": 46, 
+                        "deeply_anoxic": 1e99
+                    }
+                },
+            }
+
+        if self.substance_name in substance_dict.keys():
+            self.substance_dict = substance_dict[self.substance_name]
+        else: # return empty dict
+            self.substance_dict = \
+                {"substance_name": self.substance_name,
+                 "log_Koc": None,
+                 "omp_half_life": {
+                    "suboxic": None, 
+                    "anoxic": None, 
+                    "deeply_anoxic": None
+                    }
+                }
+
+class SubstanceRemoval():
+    '''
+    Class to calculate removal (rate) for a given organic micropollutant (omp),
+    the counterpart of MicrobialRemoval: sorption retardation (Koc/foc based)
+    and redox dependent first-order degradation.
+
+    substance: object
+        The Substance object with the organic micropollutant of interest
+
+        substance_dict: dictionary
+            'log_Koc': float
+                log of the organic carbon - water partitioning coefficient [L/kg]
+            'omp_half_life': float
+                half-life time of the substance [days]
+                per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+    '''
+
+    def __init__(self,
+                substance: Substance = 'benzene',
+                log_Koc=None,
+                omp_half_life_suboxic=None,
+                omp_half_life_anoxic=None,
+                omp_half_life_deeply_anoxic=None,
+                ):
+        '''
+        Initialization of the SubstanceRemoval class, checks for user-defined 
+        substance removal parameters and overrides the database values.
+
+        Parameters
+        ----------
+        substance: object
+            The Substance object with the organic micropollutant (OMP) of interest
+        log_Koc: float
+            log of the organic carbon - water partitioning coefficient [L/kg]
+        omp_half_life_suboxic, omp_half_life_anoxic, omp_half_life_deeply_anoxic: float
+            half-life time of the substance [days]
+            per redox zone ('suboxic', 'anoxic', deeply_anoxic')
+        '''
+        self.substance_name = substance
+
+        # User defined removal parameters [omp]
+        user_removal_parameters = \
+            {"substance_name": self.substance_name,
+                "log_Koc": log_Koc,
+                "omp_half_life": {
+                    "suboxic": omp_half_life_suboxic, 
+                    "anoxic": omp_half_life_anoxic, 
+                    "deeply_anoxic": omp_half_life_deeply_anoxic
+                }
+            }
+
+        # Load (default) substance data
+        self.Substance = Substance(substance_name = substance)
+        default_removal_parameters = self.Substance.substance_dict
+
+        # reassign the values from the default dict if not input by the user
+        for key, value in user_removal_parameters.items():
+            if type(value) is dict:
+                for tkey, cvalue in value.items():
+                    if cvalue is None:
+                        user_removal_parameters[key][tkey] = default_removal_parameters[key][tkey]
+            elif value is None:
+                user_removal_parameters[key] = default_removal_parameters[key]
+
+        #assign updated dict as attribute of the class to be able to access later
+        self.removal_parameters = user_removal_parameters
+
+    def redox_parameter(self, parameter, redox = 'anoxic'):
+        ''' Look up a redox dependent removal parameter of the substance
+            ['omp_half_life'] (see 'redox_parameter' of this module). '''
+        return redox_parameter(self.removal_parameters, parameter, redox)
+
+    def calc_retardation(self, por_eff = 0.33,
+                solid_density = 2.65,
+                fraction_organic_carbon = 0.001,
+                log_Koc = 1.92):
+        ''' Calculate the retardation factor R [-] for linear, organic carbon
+            based sorption:
+
+            R = 1 + (1 - por_eff) / por_eff * solid_density * foc * Koc
+
+            Parameters
+            -----------
+            por_eff: float
+                effective porosity [-]
+
+            solid_density: float
+                density of the solid phase [kg L-1]
+
+            fraction_organic_carbon: float
+                fraction of organic carbon in the sediment [-]
+
+            log_Koc: float
+                log of the organic carbon - water partitioning coefficient [L/kg]
+
+            Returns
+            --------
+                retardation
+        '''
+        return 1 + (1 - por_eff) / por_eff * solid_density * \
+            fraction_organic_carbon * 10**log_Koc
+
+    def calc_advective_substance_removal(self, por_eff = 0.33,
+                                        solid_density = 2.65,
+                                        fraction_organic_carbon = 0.001,
+                                        conc_start = 1., conc_gw = 0.,
+                                        redox = 'anoxic',
+                                        distance_traveled = 1., traveltime = 100.,
+                                        log_Koc = None, omp_half_life = None):
+        ''' Calculate the advective removal of an organic micropollutant from
+            source to end_point by sorption retardation and first-order
+            degradation (in the dissolved and sorbed phase) during the
+            retarded travel time.
+
+            Parameters
+            -----------
+            redox: str or array_like
+                redox condition ['suboxic','anoxic','deeply_anoxic']
+
+            por_eff: float
+                effective porosity [-]
+
+            solid_density: float
+                density of the solid phase [kg L-1]
+
+            fraction_organic_carbon: float
+                fraction of organic carbon in the sediment [-]
+
+            log_Koc: float
+                log of the organic carbon - water partitioning coefficient [L/kg]
+
+            omp_half_life: float
+                half-life time of the substance [days]
+
+            conc_start: float
+                starting concentration
+
+            conc_gw: float
+                initial groundwater concentration
+
+            distance_traveled: float
+                distance between points [m]
+
+            traveltime: float
+                (unretarded) time between start and endpoint [days]
+
+            Calculates
+            -----------
+
+            retardation: float
+                retardation factor [-]
+
+            k_deg: float
+                first-order degradation rate [day-1]
+
+            lamda: float
+                removal rate per day of (unretarded) travel time [day-1],
+                k_deg * retardation
+
+            C_final: float
+                final concentration
+
+            All numerical parameters (and 'redox') may also be given as
+            numpy arrays of equal (or broadcastable) shape.
+
+            Returns
+            --------
+                C_final
+        '''
+
+        # log Koc [L/kg]
+        if log_Koc is None:
+            log_Koc = self.removal_parameters['log_Koc']
+
+        # half-life [days]
+        if omp_half_life is None:
+            omp_half_life = self.redox_parameter('omp_half_life', redox)
+
+        # Retardation factor [-]
+        self.retardation = self.calc_retardation(por_eff = por_eff,
+                                    solid_density = solid_density,
+                                    fraction_organic_carbon = fraction_organic_carbon,
+                                    log_Koc = log_Koc)
+
+        # First-order degradation rate [day -1]
+        self.k_deg = np.log(2) / omp_half_life
+        # Removal rate over the (unretarded) travel time [day -1]
+        self.lamda = self.k_deg * self.retardation
+
+        # porewater_velocity
+        v_por = calc_porewater_velocity(distance_traveled, traveltime)
 
+        # Calculate concentration after removal in subsurface
+        C_final = calc_C_final(conc_start, conc_gw, self.lamda, v_por, distance_traveled)
 
         # return final concentration 'C_final'
-        return C_final
\ No newline at end of file
+        return C_final
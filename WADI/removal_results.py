@@ -0,0 +1,310 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import inspect
+
+import numpy as np
+import pandas as pd
+
+from WADI.removal_functions import REDOX_ZONES, MicrobialRemoval, SubstanceRemoval
+
+# Columns of the result store and their dtype
+RESULT_COLUMNS = {'flowline_id': np.int64,
+                  'organism_code': np.int32,
+                  'redox_code': np.int8,
+                  'k_att': np.float64,
+                  'lambda': np.float64,
+                  'C_final': np.float64,
+                  'log_removal': np.float64}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as exc:
+        raise ImportError("Exporting removal results to Arrow/Parquet requires "
+                          "'pyarrow' (pip install pyarrow)") from exc
+    return pyarrow
+
+
+def species_name(removal):
+    ''' Organism or substance name of a MicrobialRemoval/SubstanceRemoval. '''
+    if isinstance(removal, SubstanceRemoval):
+        return removal.substance_name
+    return removal.organism_name
+
+
+def flowline_codes(flowline_id):
+    ''' Integer flowline IDs are stored as they are; other labels (e.g.
+        strings) are stored as integer codes into the returned labels.
+
+        Returns
+        --------
+            codes (int64), labels (np.ndarray, None for integer IDs)
+    '''
+    flowline_id = np.asarray(flowline_id)
+    if flowline_id.dtype.kind in 'iub':
+        return flowline_id.astype(np.int64), None
+    codes, labels = pd.factorize(flowline_id.ravel())
+    return codes.astype(np.int64).reshape(flowline_id.shape), np.asarray(labels, dtype = object)
+
+
+def calc_log_removal(lamda, traveltime, C_final, conc_start = 1., conc_gw = 0.):
+    ''' Log removal log10(conc_start / C_final) per flowline.
+
+        Without a background concentration (conc_gw == 0) this equals
+        lambda * traveltime / ln(10), which is used instead as it remains
+        finite when C_final underflows to zero. With a background
+        concentration C_final approaches conc_gw, which limits the removal.
+    '''
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        log_removal = np.log10(np.divide(conc_start, C_final))
+    return np.where(np.asarray(conc_gw) == 0, lamda * traveltime / np.log(10.),
+                    log_removal)
+
+
+def redox_codes(redox):
+    ''' Integer code per redox zone (index in REDOX_ZONES, -1 if unknown). '''
+    redox = np.asarray(redox, dtype = object)
+    codes = np.full(redox.shape, -1, dtype = np.int8)
+    for code, zone in enumerate(REDOX_ZONES):
+        codes[redox == zone] = code
+    return codes
+
+
+class RemovalResults:
+    '''
+    Typed columnar store for the removal results of many flowlines.
+
+    Each column is a contiguous numpy array (see RESULT_COLUMNS) which batch
+    calculations fill directly; organisms (or substances) and redox zones are
+    stored as integer codes into 'organisms' and REDOX_ZONES. Flowline IDs
+    other than integers (e.g. string labels) are stored the same way, as
+    codes in 'flowline_id' into 'flowline_labels'. For substances 'k_att' is
+    NaN and 'lambda' is the degradation rate times retardation.
+
+    Attributes
+    ----------
+    columns: dict
+        np.ndarray per column
+    organisms: list
+        organism (or substance) names, indexed by 'organism_code'
+    flowline_labels: np.ndarray or None
+        flowline labels, indexed by 'flowline_id' (None: the IDs are the labels)
+    '''
+
+    def __init__(self, columns, organisms = (), flowline_labels = None):
+        self.organisms = list(organisms)
+        self.flowline_labels = flowline_labels
+        self.columns = {name: np.ascontiguousarray(columns[name], dtype = dtype)
+                        for name, dtype in RESULT_COLUMNS.items()}
+        n_rows = {len(values) for values in self.columns.values()}
+        if len(n_rows) > 1:
+            raise ValueError("All result columns should have the same length")
+
+    @classmethod
+    def empty(cls, n_flowlines, organisms = (), flowline_labels = None):
+        ''' Preallocated store for 'n_flowlines' rows (filled with NaN). '''
+        columns = {name: np.full(n_flowlines, np.nan) if dtype is np.float64
+                   else np.full(n_flowlines, -1, dtype = dtype)
+                   for name, dtype in RESULT_COLUMNS.items()}
+        columns['flowline_id'] = np.arange(n_flowlines, dtype = np.int64)
+        return cls(columns, organisms, flowline_labels)
+
+    @classmethod
+    def from_removal(cls, removal, C_final, redox, traveltime,
+                     flowline_id = None, conc_start = 1., conc_gw = 0.):
+        ''' Results of a (vectorized) 'calc_advective_microbial_removal' or
+            'calc_advective_substance_removal' call.
+
+            Parameters
+            -----------
+            removal: MicrobialRemoval or SubstanceRemoval
+                removal object after the calculation (provides lamda, k_att)
+            C_final: array_like
+                final concentrations returned by the calculation
+            redox: str or array_like
+                redox condition(s) used in the calculation
+            traveltime: float or array_like
+                travel time(s) [days] used in the calculation
+            flowline_id: array_like, optional
+                identifier (integer or label) per flowline (default: 0, 1, 2, ...)
+            conc_start, conc_gw: float or array_like
+                start and background concentration(s) used in the calculation
+        '''
+        C_final = np.atleast_1d(np.asarray(C_final, dtype = float))
+        results = cls.empty(len(C_final), organisms = [species_name(removal)])
+        if flowline_id is not None:
+            results.columns['flowline_id'][:], results.flowline_labels = \
+                flowline_codes(flowline_id)
+        results.fill(slice(None), species_name(removal), redox,
+                     getattr(removal, 'k_att', np.nan), removal.lamda, C_final, traveltime,
+                     conc_start = conc_start, conc_gw = conc_gw)
+        return results
+
+    def __len__(self):
+        return len(self.columns['flowline_id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def flowline_label(self):
+        ''' Flowline label per row. '''
+        if self.flowline_labels is None:
+            return self.columns['flowline_id']
+        return self.flowline_labels[self.columns['flowline_id']]
+
+    def organism_code(self, organism):
+        ''' Code of 'organism', adding it to the organisms if needed. '''
+        if organism not in self.organisms:
+            self.organisms.append(organism)
+        return self.organisms.index(organism)
+
+    def fill(self, rows, organism, redox, k_att, lamda, C_final, traveltime,
+             conc_start = 1., conc_gw = 0.):
+        ''' Write the results of one batch into 'rows' of the store
+            (see 'calc_log_removal' for the log removal). '''
+        lamda = np.asarray(lamda, dtype = float)
+        self.columns['organism_code'][rows] = self.organism_code(organism)
+        self.columns['redox_code'][rows] = redox_codes(redox)
+        self.columns['k_att'][rows] = k_att
+        self.columns['lambda'][rows] = lamda
+        self.columns['C_final'][rows] = C_final
+        self.columns['log_removal'][rows] = calc_log_removal(lamda, traveltime, C_final,
+                                                             conc_start, conc_gw)
+
+    @classmethod
+    def concat(cls, results):
+        ''' Concatenate the stores of several chunks or workers; organism
+            codes are remapped to a common list of organisms. '''
+        results = list(results)
+        if not results:
+            return cls.empty(0)
+        organisms = []
+        for res in results:
+            organisms.extend(org for org in res.organisms if org not in organisms)
+
+        columns = {name: np.concatenate([res.columns[name] for res in results])
+                   for name in RESULT_COLUMNS if name != 'organism_code'}
+        flowline_labels = None
+        if any(res.flowline_labels is not None for res in results):
+            columns['flowline_id'], flowline_labels = flowline_codes(
+                np.concatenate([np.asarray(res.flowline_label, dtype = object)
+                                for res in results]))
+        # code -1 (no organism) is kept via the appended last element
+        columns['organism_code'] = np.concatenate([
+            np.array([organisms.index(org) for org in res.organisms] + [-1],
+                     dtype = np.int32)[res.columns['organism_code']]
+            for res in results])
+        return cls(columns, organisms, flowline_labels)
+
+    def to_pandas(self):
+        ''' DataFrame with 'organism' and 'redox' as categoricals. '''
+        df = pd.DataFrame({name: values for name, values in self.columns.items()
+                           if name not in ('organism_code', 'redox_code')})
+        df['flowline_id'] = self.flowline_label
+        df.insert(1, 'organism', pd.Categorical.from_codes(
+            self.columns['organism_code'], categories = self.organisms))
+        df.insert(2, 'redox', pd.Categorical.from_codes(
+            self.columns['redox_code'], categories = REDOX_ZONES))
+        return df
+
+    def to_arrow(self):
+        ''' pyarrow.Table sharing the memory of the numeric columns;
+            'organism' and 'redox' become dictionary encoded columns. '''
+        pa = _import_pyarrow()
+
+        def dictionary_array(codes, categories):
+            mask = codes < 0
+            return pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask = mask if mask.any() else None),
+                pa.array(categories, type = pa.string()))
+
+        arrays, names = [], []
+        for name, values in self.columns.items():
+            if name == 'organism_code':
+                arrays.append(dictionary_array(values, self.organisms))
+                names.append('organism')
+            elif name == 'redox_code':
+                arrays.append(dictionary_array(values, REDOX_ZONES))
+                names.append('redox')
+            elif name == 'flowline_id' and self.flowline_labels is not None:
+                arrays.append(pa.array(self.flowline_label))
+                names.append(name)
+            else:
+                arrays.append(pa.array(values))
+                names.append(name)
+        return pa.Table.from_arrays(arrays, names = names)
+
+    def to_parquet(self, fpath, **kwargs):
+        ''' Write the results to a Parquet file (kwargs are passed to
+            pyarrow.parquet.write_table). '''
+        _import_pyarrow()
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), fpath, **kwargs)
+
+
+def calc_flowline_removal(flowlines, organisms = (), substances = ()):
+    ''' Removal of all organisms and substances for a set of flowlines in
+        one pass: one vectorized removal call per species, written directly
+        into a single RemovalResults store (one block of rows per species).
+
+        Parameters
+        -----------
+        flowlines: dict or pandas.DataFrame
+            flowline inputs per column (e.g. 'redox', 'por_eff', 'grainsize',
+            'pH', 'temp_water', 'fraction_organic_carbon', 'distance_traveled',
+            'traveltime'); each removal function uses the columns it accepts
+            and its defaults for missing ones
+
+        organisms: list of str or MicrobialRemoval
+            organisms (or removal objects with user-defined parameters)
+
+        substances: list of str or SubstanceRemoval
+            substances (or removal objects with user-defined parameters)
+
+        Returns
+        --------
+            RemovalResults with the (DataFrame) index of the flowlines as
+            flowline IDs (labels other than integers in 'flowline_labels')
+    '''
+    if isinstance(flowlines, pd.DataFrame):
+        flowline_id = flowlines.index.values
+        flowlines = {name: flowlines[name].values for name in flowlines.columns}
+    else:
+        flowlines = {name: np.asarray(values) for name, values in flowlines.items()}
+        shape = np.broadcast_shapes(*[np.shape(values) for values in flowlines.values()])
+        flowline_id = np.arange(shape[0] if shape else 1)
+    n_flowlines = len(flowline_id)
+
+    removals = [org if isinstance(org, MicrobialRemoval) else MicrobialRemoval(organism = org)
+                for org in organisms] + \
+               [sub if isinstance(sub, SubstanceRemoval) else SubstanceRemoval(substance = sub)
+                for sub in substances]
+
+    flowline_id, flowline_labels = flowline_codes(flowline_id)
+    results = RemovalResults.empty(n_flowlines * len(removals),
+                                   flowline_labels = flowline_labels)
+    for i, removal in enumerate(removals):
+        if isinstance(removal, SubstanceRemoval):
+            method = removal.calc_advective_substance_removal
+        else:
+            method = removal.calc_advective_microbial_removal
+        # flowline inputs only (species parameters are taken from 'removal')
+        inputs = {name: par.default for name, par in inspect.signature(method).parameters.items()
+                  if par.default is not None}
+        kwargs = {name: values for name, values in flowlines.items() if name in inputs}
+        redox = kwargs.get('redox', inputs['redox'])
+        traveltime = kwargs.get('traveltime', inputs['traveltime'])
+        conc_start = kwargs.get('conc_start', inputs['conc_start'])
+        conc_gw = kwargs.get('conc_gw', inputs['conc_gw'])
+
+        C_final = np.broadcast_to(method(**kwargs), (n_flowlines,))
+        rows = slice(i * n_flowlines, (i + 1) * n_flowlines)
+        results.columns['flowline_id'][rows] = flowline_id
+        results.fill(rows, species_name(removal), redox,
+                     getattr(removal, 'k_att', np.nan), removal.lamda, C_final, traveltime,
+                     conc_start = conc_start, conc_gw = conc_gw)
+    return results
@@ -0,0 +1,395 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import inspect
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from WADI.removal_functions import MicrobialRemoval, SubstanceRemoval
+
+
+def _flowline_defaults(method):
+    return {name: par.default
+            for name, par in inspect.signature(method).parameters.items()
+            if name != 'self'}
+
+# Per request type ('organism' or 'substance'): removal class, vectorized
+# removal function, its flowline inputs (with defaults) and the returned results.
+# Inputs defaulting to None are species parameters taken from the database.
+REMOVAL_FUNCTIONS = {
+    'organism': (MicrobialRemoval, 'calc_advective_microbial_removal',
+                 _flowline_defaults(MicrobialRemoval.calc_advective_microbial_removal),
+                 {'lambda': 'lamda', 'k_att': 'k_att'}),
+    'substance': (SubstanceRemoval, 'calc_advective_substance_removal',
+                  _flowline_defaults(SubstanceRemoval.calc_advective_substance_removal),
+                  {'lambda': 'lamda', 'retardation': 'retardation'}),
+    }
+
+
+def request_species(request):
+    ''' (request type, species name) of a request, i.e. ('organism', name)
+        or ('substance', name). '''
+    if not isinstance(request, dict):
+        raise ValueError("Request should be a JSON object, got %s" % type(request).__name__)
+    kinds = [kind for kind in REMOVAL_FUNCTIONS if kind in request]
+    if len(kinds) != 1:
+        raise ValueError("Request should contain exactly one of "
+                         + ", ".join("'%s'" % kind for kind in REMOVAL_FUNCTIONS))
+    name = request[kinds[0]]
+    if not isinstance(name, str):
+        raise ValueError("'%s' should be a string" % kinds[0])
+    return kinds[0], name
+
+
+def _set_future(future, result = None, exception = None):
+    # the requester may have been cancelled (e.g. a client timeout)
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class LatencyMetrics:
+    '''
+    Rolling latency statistics of the requests handled by a RemovalBatcher.
+
+    Attributes
+    ----------
+    latencies: deque
+        latency [s] of the most recent 'window' requests
+    n_requests: int
+        total number of requests handled
+    n_batches: int
+        total number of batched evaluations
+    '''
+
+    def __init__(self, window = 10000):
+        self.latencies = deque(maxlen = window)
+        self.n_requests = 0
+        self.n_batches = 0
+
+    def record_batch(self, latencies):
+        ''' Register the latencies [s] of all requests of one batch. '''
+        self.latencies.extend(latencies)
+        self.n_requests += len(latencies)
+        self.n_batches += 1
+
+    def summary(self):
+        '''
+        Returns
+        --------
+        dict with request and batch counts, mean batch size and the
+        p50, p90, p99 and max latency [ms] over the rolling window.
+        '''
+        summary = {"n_requests": self.n_requests,
+                   "n_batches": self.n_batches,
+                   "mean_batch_size": self.n_requests / max(self.n_batches, 1)}
+        if len(self.latencies) == 0:
+            return summary
+        latencies_ms = np.asarray(self.latencies) * 1000.
+        p50, p90, p99 = np.percentile(latencies_ms, [50., 90., 99.])
+        summary.update({"latency_p50_ms": float(p50),
+                        "latency_p90_ms": float(p90),
+                        "latency_p99_ms": float(p99),
+                        "latency_max_ms": float(latencies_ms.max())})
+        return summary
+
+
+def calc_batch_removal(removal, requests):
+    ''' Evaluate a list of flowline requests for one organism or substance
+        in a single vectorized call of its removal function
+        ('calc_advective_microbial_removal' or 'calc_advective_substance_removal').
+
+        Parameters
+        -----------
+        removal: MicrobialRemoval or SubstanceRemoval
+            removal object of the species shared by all requests
+
+        requests: list of dict
+            flowline parameters per request; missing parameters take the
+            defaults of the removal function
+
+        Returns
+        --------
+            list of dict with 'C_final', 'lambda' and 'k_att' (organisms) or
+            'retardation' (substances) per request
+    '''
+    kind = 'organism' if isinstance(removal, MicrobialRemoval) else 'substance'
+    _, method, defaults, result_attributes = REMOVAL_FUNCTIONS[kind]
+    unknown = set().union(*requests) - set(defaults) - {kind}
+    if unknown:
+        raise ValueError("Unknown flowline parameter(s): " + ", ".join(sorted(unknown)))
+
+    redox = np.array([req.get('redox', defaults['redox']) for req in requests])
+    kwargs = {'redox': redox}
+    for name, default in defaults.items():
+        if name == 'redox':
+            continue
+        if default is None:
+            # species parameter: database values unless overridden per request
+            fallback = removal.removal_parameters[name]
+            if fallback is not None and all(req.get(name) is None for req in requests):
+                continue
+            if type(fallback) is dict:
+                fallback = removal.redox_parameter(name, redox)
+            else:
+                fallback = np.full(len(requests), np.nan if fallback is None else fallback)
+            values = np.array([req.get(name) if req.get(name) is not None else fallback[i]
+                               for i, req in enumerate(requests)], dtype = float)
+        else:
+            values = np.array([req.get(name, default) for req in requests], dtype = float)
+        kwargs[name] = values
+
+    C_final = getattr(removal, method)(**kwargs)
+    if np.isnan(C_final).any():
+        raise ValueError("Removal of %s '%s' could not be calculated for redox '%s' "
+                         "(missing removal parameters?)"
+                         % (kind, requests[0][kind], redox[np.isnan(C_final)][0]))
+    results = {"C_final": C_final}
+    for key, attribute in result_attributes.items():
+        results[key] = np.broadcast_to(getattr(removal, attribute), C_final.shape)
+
+    return [{key: float(values[i]) for key, values in results.items()}
+            for i in range(len(requests))]
+
+
+class RemovalBatcher:
+    '''
+    Micro-batches concurrent removal requests: requests arriving within
+    'batch_window' seconds of the first request in a batch are grouped per
+    organism (or substance) and evaluated in one vectorized MicrobialRemoval
+    (or SubstanceRemoval) call.
+
+    Attributes
+    ----------
+    batch_window: float
+        maximum time [s] to wait for additional requests
+    max_batch_size: int
+        maximum number of requests in one batch
+    metrics: LatencyMetrics
+        latency percentiles and batch statistics
+    '''
+
+    def __init__(self, batch_window = 0.002, max_batch_size = 4096):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.metrics = LatencyMetrics()
+        # removal objects per species (default parameters are reused)
+        self._removal_objects = {}
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        ''' Start the batching loop on the running event loop. '''
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        ''' Stop the batching loop; pending requests are cancelled. '''
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                future.cancel()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def submit(self, request):
+        ''' Queue a single flowline request (dict with 'organism' or
+            'substance') and wait for its result. '''
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future, time.perf_counter()))
+        return await future
+
+    def removal_object(self, kind, name):
+        ''' Cached removal object of organism/substance 'name'. '''
+        if (kind, name) not in self._removal_objects:
+            removal_class = REMOVAL_FUNCTIONS[kind][0]
+            self._removal_objects[(kind, name)] = removal_class(name)
+        return self._removal_objects[(kind, name)]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stopped within the batch window: the requests taken off
+                # the queue are cancelled as well
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            # Take whatever else is already queued without waiting
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                self._evaluate(batch)
+            except Exception as exc:
+                # never let a batch stop the loop: fail its pending requests
+                for _, future, _ in batch:
+                    _set_future(future, exception = exc)
+
+    def _evaluate(self, batch):
+        groups = {}
+        for item in batch:
+            try:
+                species = request_species(item[0])
+            except Exception as exc:
+                _set_future(item[1], exception = exc)
+                continue
+            groups.setdefault(species, []).append(item)
+
+        for species, items in groups.items():
+            self._evaluate_group(species, items)
+
+        now = time.perf_counter()
+        self.metrics.record_batch([now - started for _, _, started in batch])
+
+    def _evaluate_group(self, species, items):
+        requests = [request for request, _, _ in items]
+        try:
+            results = calc_batch_removal(self.removal_object(*species), requests)
+        except Exception as exc:
+            if len(items) > 1:
+                # isolate the faulty request(s) instead of failing the group
+                for item in items:
+                    self._evaluate_group(species, [item])
+                return
+            results = [exc]
+        for (_, future, _), result in zip(items, results):
+            if isinstance(result, Exception):
+                _set_future(future, exception = result)
+            else:
+                _set_future(future, result = result)
+
+
+class RemovalService:
+    '''
+    Minimal HTTP/1.1 front-end for a RemovalBatcher, served over TCP or a
+    Unix socket.
+
+    Routes
+    ------
+    POST /removal
+        JSON object (single flowline) or list of objects; returns the
+        result(s) of the organism or substance removal function
+    GET /metrics
+        JSON summary of the batcher's LatencyMetrics
+    '''
+
+    def __init__(self, batcher = None):
+        self.batcher = RemovalBatcher() if batcher is None else batcher
+
+    async def serve(self, host = '127.0.0.1', port = 8080, path = None):
+        ''' Start the server (on Unix socket 'path' if given) and return the
+            asyncio.Server object. '''
+        await self.batcher.start()
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path = path)
+        return await asyncio.start_server(self.handle_connection, host = host, port = port)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self._dispatch(method, target, body)
+                data = json.dumps(payload).encode()
+                writer.write(("HTTP/1.1 %s\r\nContent-Type: application/json\r\n"
+                              "Content-Length: %d\r\n\r\n" % (status, len(data))).encode() + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        if method == 'GET' and target == '/metrics':
+            return '200 OK', self.batcher.metrics.summary()
+        if method != 'POST' or target != '/removal':
+            return '404 Not Found', {"error": "unknown route %s %s" % (method, target)}
+        try:
+            requests = json.loads(body)
+        except ValueError as exc:
+            return '400 Bad Request', {"error": str(exc)}
+
+        many = isinstance(requests, list)
+        results = await asyncio.gather(
+            *[self.batcher.submit(req) for req in (requests if many else [requests])],
+            return_exceptions = True)
+        results = [{"error": str(res)} if isinstance(res, Exception) else res
+                   for res in results]
+        if not many:
+            status = '400 Bad Request' if 'error' in results[0] else '200 OK'
+            return status, results[0]
+        return '200 OK', results
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description = "Serve WADI (microbial and substance) removal calculations over HTTP.")
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--unix-socket', default = None,
+                        help = "serve on this Unix socket instead of TCP")
+    parser.add_argument('--batch-window', type = float, default = 0.002,
+                        help = "micro-batch window [s]")
+    parser.add_argument('--max-batch-size', type = int, default = 4096)
+    args = parser.parse_args(argv)
+
+    async def run():
+        service = RemovalService(RemovalBatcher(batch_window = args.batch_window,
+                                                max_batch_size = args.max_batch_size))
+        server = await service.serve(host = args.host, port = args.port,
+                                     path = args.unix_socket)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
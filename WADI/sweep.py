@@ -0,0 +1,225 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from WADI.removal_functions import REDOX_ZONES, MicrobialRemoval
+
+# Parameter axes of a sweep (in order); distance is always the last axis
+SWEEP_AXES = ('organism', 'redox', 'grainsize', 'por_eff', 'pH', 'temp_water',
+              'porewater_velocity', 'distance_traveled')
+# Organism parameters looked up per (organism, redox) combination
+ORGANISM_PARAMETERS = ('alpha0', 'pH0', 'mu1', 'organism_diam', 'mu1_temp_ref', 'mu1_Q10')
+
+
+class FeasibleRegion:
+    '''
+    Compact result of a sweep: per combination of the parameters other than
+    the distance, the index of the shortest distance that meets the target
+    log removal (-1: not met within the largest distance).
+
+    Attributes
+    ----------
+    axes: dict
+        values per sweep axis
+    min_distance_index: np.ndarray of int
+        shape of the sweep without the distance axis; smallest signed
+        integer type holding the distance indices (e.g. int16)
+    target_log_removal: float
+        target log removal
+    '''
+
+    def __init__(self, axes, min_distance_index, target_log_removal):
+        self.axes = axes
+        self.min_distance_index = min_distance_index
+        self.target_log_removal = target_log_removal
+
+    @property
+    def min_distance(self):
+        ''' Shortest distance [m] meeting the target (NaN if infeasible). '''
+        distances = np.append(np.asarray(self.axes['distance_traveled'], dtype = float), np.nan)
+        return distances[self.min_distance_index]
+
+    @property
+    def fraction_feasible(self):
+        ''' Fraction of the combinations for which the target is met. '''
+        return float((self.min_distance_index >= 0).mean())
+
+    def to_frame(self, feasible_only = True):
+        ''' DataFrame with one row per (feasible) parameter combination and
+            its shortest distance meeting the target. '''
+        index = np.flatnonzero(self.min_distance_index >= 0) if feasible_only \
+            else np.arange(self.min_distance_index.size)
+        coords = np.unravel_index(index, self.min_distance_index.shape)
+        df = pd.DataFrame({name: np.asarray(self.axes[name], dtype = object
+                                            if name in ('organism', 'redox') else float)[coord]
+                           for name, coord in zip(SWEEP_AXES[:-1], coords)})
+        df['min_distance'] = self.min_distance.ravel()[index]
+        return df
+
+
+class ScenarioSweep:
+    '''
+    Lazy Cartesian grid sweep of the advective microbial removal over
+    organism x redox x grainsize x porosity x pH x temperature x porewater
+    velocity x distance.
+
+    The grid is never materialized: combinations are generated in blocks of
+    'block_size' from their flat index and streamed through the vectorized
+    removal calculation. The removal coefficient does not depend on the
+    distance at a given porewater velocity, so the removal is evaluated once
+    per combination and the log removal, lambda * distance / v_por / ln(10),
+    is linear in the distance; the shortest distance meeting a target log
+    removal follows directly from it.
+    '''
+
+    def __init__(self, organism = ('carotovorum',), redox = REDOX_ZONES,
+                 grainsize = (0.00025,), por_eff = (0.33,), pH = (7.5,),
+                 temp_water = (11.,), porewater_velocity = (0.01,),
+                 distance_traveled = (1.,), rho_water = 999.703,
+                 block_size = 100000):
+        '''
+        Parameters
+        ----------
+        organism: list of str or MicrobialRemoval
+            organisms (or removal objects with user-defined parameters)
+        redox: list of str
+            redox conditions ['suboxic','anoxic','deeply_anoxic']
+        grainsize, por_eff, pH, temp_water: list of float
+            grain diameter [m], effective porosity [-], pH [-] and
+            water temperature [degrees celcius]
+        porewater_velocity: list of float
+            porewater velocity [m/d]
+        distance_traveled: list of float
+            distances [m] (sorted ascending in the sweep)
+        rho_water: float
+            water density [kg m-3]
+        block_size: int
+            number of parameter combinations (excl. distance) per block
+        '''
+        self.removals = [org if isinstance(org, MicrobialRemoval) else MicrobialRemoval(organism = org)
+                         for org in np.atleast_1d(organism)]
+        self.axes = {'organism': [removal.organism_name for removal in self.removals],
+                     'redox': list(np.atleast_1d(redox))}
+        for name, values in (('grainsize', grainsize), ('por_eff', por_eff), ('pH', pH),
+                             ('temp_water', temp_water),
+                             ('porewater_velocity', porewater_velocity),
+                             ('distance_traveled', distance_traveled)):
+            self.axes[name] = np.atleast_1d(np.asarray(values, dtype = float))
+        self.axes['distance_traveled'] = np.sort(self.axes['distance_traveled'])
+        self.rho_water = rho_water
+        self.block_size = block_size
+
+        # organism parameters per (organism, redox): shape (n_organisms, n_redox)
+        self._organism_parameters = {name: np.full((len(self.removals), len(self.axes['redox'])),
+                                                   np.nan)
+                                     for name in ORGANISM_PARAMETERS}
+        for i, removal in enumerate(self.removals):
+            for name in ORGANISM_PARAMETERS:
+                value = removal.removal_parameters[name]
+                if type(value) is dict:
+                    value = removal.redox_parameter(name, np.array(self.axes['redox'], dtype = object))
+                self._organism_parameters[name][i] = np.nan if value is None else value
+
+    @property
+    def shape(self):
+        ''' Shape of the full grid (one dimension per axis in SWEEP_AXES). '''
+        return tuple(len(self.axes[name]) for name in SWEEP_AXES)
+
+    @property
+    def n_scenarios(self):
+        ''' Number of grid points (incl. the distance axis). '''
+        return int(np.prod(self.shape))
+
+    def iter_blocks(self):
+        ''' Generate blocks of parameter combinations (excl. distance) with
+            their removal coefficients.
+
+            Yields
+            -------
+            dict with 'index' (flat index into the grid without the distance
+            axis), the parameter values per axis, and 'lamda', 'k_att' and
+            'v_por' per combination
+        '''
+        shape = self.shape[:-1]
+        n_combinations = int(np.prod(shape))
+        # distance independent evaluation: unit distance at the porewater velocity
+        calc = MicrobialRemoval(organism = self.axes['organism'][0])
+
+        for start in range(0, n_combinations, self.block_size):
+            index = np.arange(start, min(start + self.block_size, n_combinations))
+            coords = dict(zip(SWEEP_AXES[:-1], np.unravel_index(index, shape)))
+            block = {'index': index}
+            for name in SWEEP_AXES[:-1]:
+                block[name] = np.asarray(self.axes[name], dtype = object
+                                         if name in ('organism', 'redox') else float)[coords[name]]
+            organism_parameters = {name: values[coords['organism'], coords['redox']]
+                                   for name, values in self._organism_parameters.items()}
+
+            v_por = block['porewater_velocity']
+            calc.calc_advective_microbial_removal(grainsize = block['grainsize'],
+                                                  temp_water = block['temp_water'],
+                                                  rho_water = self.rho_water,
+                                                  pH = block['pH'],
+                                                  por_eff = block['por_eff'],
+                                                  redox = block['redox'],
+                                                  distance_traveled = 1.,
+                                                  traveltime = 1. / v_por,
+                                                  **organism_parameters)
+            block['lamda'] = calc.lamda
+            block['k_att'] = calc.k_att
+            block['v_por'] = v_por
+            yield block
+
+    def iter_log_removal(self):
+        ''' Stream the log removal per block over the distances (ascending).
+
+            Yields
+            -------
+            block dict (see 'iter_blocks') with 'log_removal' of shape
+            (n_block, n_distances)
+        '''
+        distances = self.axes['distance_traveled']
+        for block in self.iter_blocks():
+            block['log_removal'] = self._log_removal_rate(block)[:, None] * distances
+            yield block
+
+    @staticmethod
+    def _log_removal_rate(block):
+        # log removal per meter [m-1]
+        return block['lamda'] / block['v_por'] / np.log(10.)
+
+    def feasible_region(self, target_log_removal):
+        ''' Shortest distance meeting 'target_log_removal' for every
+            combination of the other parameters, evaluated block by block
+            without evaluating the distance axis: the index follows from
+            target_log_removal / (log removal per meter).
+
+            Returns
+            --------
+                FeasibleRegion
+        '''
+        distances = self.axes['distance_traveled']
+        n_distances = len(distances)
+        # compact index: smallest signed type holding -n_distances .. n_distances
+        min_distance_index = np.full(int(np.prod(self.shape[:-1])), -1,
+                                     dtype = np.promote_types(np.min_scalar_type(-n_distances),
+                                                              np.int16))
+        for block in self.iter_blocks():
+            rate = self._log_removal_rate(block)
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                index = np.searchsorted(distances, target_log_removal / rate)
+            # correct rounding of the division so that the index agrees with
+            # the condition rate * distance >= target_log_removal
+            previous = np.maximum(index - 1, 0)
+            index = np.where((index > 0) & (rate * distances[previous] >= target_log_removal),
+                             previous, index)
+            current = np.minimum(index, n_distances - 1)
+            index = np.where((index < n_distances) &
+                             ~(rate * distances[current] >= target_log_removal),
+                             index + 1, index)
+            min_distance_index[block['index']] = np.where(index < n_distances, index, -1)
+        return FeasibleRegion(self.axes, min_distance_index.reshape(self.shape[:-1]),
+                              target_log_removal)
@@ -0,0 +1,202 @@
+#%% ----------------------------------------------------------------------------
+# INITIALISATION OF PYTHON e.g. packages, etc.
+# ------------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class WellFieldAggregation:
+    '''
+    Aggregates flowline removal results to wells (and well fields) through a
+    sparse (CSR) weight matrix: row i holds the weights (e.g. discharge
+    [m3/d]) of the flowlines drawn by well i.
+
+    All statistics are evaluated for all wells at once with sparse matrix
+    products and segment reductions over the CSR structure, so after a
+    parameter change only the flowline results need to be recomputed.
+
+    Attributes
+    ----------
+    weights: scipy.sparse.csr_matrix
+        flowline weights per well, shape (n_wells, n_flowlines)
+    well_flow: np.ndarray
+        total weight (discharge) per well
+    wellfield_index: np.ndarray
+        well field of each well (default: all wells in well field 0)
+    '''
+
+    def __init__(self, weights, wellfield_index = None):
+        '''
+        Parameters
+        ----------
+        weights: scipy.sparse matrix or array_like
+            flowline weights per well, shape (n_wells, n_flowlines)
+        wellfield_index: array_like of int, optional
+            well field of each well, shape (n_wells,)
+        '''
+        self.weights = sparse.csr_matrix(weights, dtype = float)
+        self.weights.sum_duplicates()
+        self.weights.eliminate_zeros()
+        self.weights.sort_indices()
+        if (self.weights.data < 0).any():
+            raise ValueError("Flowline weights should be non-negative")
+        self.n_wells, self.n_flowlines = self.weights.shape
+
+        self.well_flow = np.asarray(self.weights.sum(axis = 1)).ravel()
+        # flow weighted mixing: rows normalized to a sum of 1
+        with np.errstate(divide = 'ignore'):
+            scale = np.where(self.well_flow > 0, 1. / self.well_flow, 0.)
+        self._mixing = sparse.diags(scale) @ self.weights
+        # wells without flow have no mixed concentration (NaN, not 0)
+        self._empty_wells = self.well_flow == 0
+
+        if wellfield_index is None:
+            wellfield_index = np.zeros(self.n_wells, dtype = int)
+        self.wellfield_index = np.asarray(wellfield_index, dtype = int)
+        n_wellfields = self.wellfield_index.max() + 1 if self.n_wells else 0
+        wellfield_weights = sparse.csr_matrix(
+            (self.well_flow, (self.wellfield_index, np.arange(self.n_wells))),
+            shape = (n_wellfields, self.n_wells))
+        # wells without flow do not contribute (their NaN concentration neither)
+        wellfield_weights.eliminate_zeros()
+        wellfield_flow = np.asarray(wellfield_weights.sum(axis = 1)).ravel()
+        with np.errstate(divide = 'ignore'):
+            scale = np.where(wellfield_flow > 0, 1. / wellfield_flow, 0.)
+        self._wellfield_mixing = sparse.diags(scale) @ wellfield_weights
+        self._empty_wellfields = wellfield_flow == 0
+
+        # well index of each stored weight (segment id for the reductions)
+        self._row = np.repeat(np.arange(self.n_wells), np.diff(self.weights.indptr))
+
+    @classmethod
+    def from_flowlines(cls, well_index, weight = 1., n_wells = None,
+                       wellfield_index = None):
+        ''' Aggregation for flowlines that each end in a single well.
+
+            Parameters
+            -----------
+            well_index: array_like of int
+                well of each flowline, shape (n_flowlines,)
+            weight: float or array_like
+                weight (discharge) of each flowline
+            n_wells: int, optional
+                number of wells (default: max(well_index) + 1)
+            wellfield_index: array_like of int, optional
+                well field of each well
+        '''
+        well_index = np.asarray(well_index, dtype = int)
+        n_flowlines = len(well_index)
+        if n_wells is None:
+            n_wells = well_index.max() + 1 if n_flowlines else 0
+        weight = np.broadcast_to(np.asarray(weight, dtype = float), (n_flowlines,))
+        weights = sparse.csr_matrix((weight, (well_index, np.arange(n_flowlines))),
+                                    shape = (n_wells, n_flowlines))
+        return cls(weights, wellfield_index = wellfield_index)
+
+    def _check(self, values):
+        values = np.asarray(values, dtype = float)
+        if values.shape[0] != self.n_flowlines:
+            raise ValueError("Expected %d flowline values along the first axis, got %d"
+                             % (self.n_flowlines, values.shape[0]))
+        return values
+
+    def mixed_concentration(self, C_final):
+        ''' Flow weighted (mixed) concentration per well.
+
+            Parameters
+            -----------
+            C_final: array_like
+                concentration per flowline, shape (n_flowlines,) or
+                (n_flowlines, n) e.g. a transposed seasonal result
+
+            Returns
+            --------
+                mixed concentration, shape (n_wells,) or (n_wells, n);
+                NaN for wells without flowlines
+        '''
+        C_mixed = np.asarray(self._mixing @ self._check(C_final), dtype = float)
+        C_mixed[self._empty_wells] = np.nan
+        return C_mixed
+
+    def wellfield_concentration(self, C_final):
+        ''' Flow weighted (mixed) concentration per well field (NaN for
+            well fields without flow). '''
+        C_wellfield = np.asarray(self._wellfield_mixing @ self.mixed_concentration(C_final),
+                                 dtype = float)
+        C_wellfield[self._empty_wellfields] = np.nan
+        return C_wellfield
+
+    def log_removal(self, C_final, conc_start = 1.):
+        ''' Log removal per well, log10(C_start / C_mixed), of the mixed
+            concentration with respect to the mixed start concentration. '''
+        C_mixed = self.mixed_concentration(C_final)
+        C_start = self.mixed_concentration(np.broadcast_to(conc_start, np.shape(C_final)))
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return np.log10(C_start / C_mixed)
+
+    def wellfield_log_removal(self, C_final, conc_start = 1.):
+        ''' Log removal per well field of the mixed concentration. '''
+        C_mixed = self.wellfield_concentration(C_final)
+        C_start = self.wellfield_concentration(np.broadcast_to(conc_start, np.shape(C_final)))
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return np.log10(C_start / C_mixed)
+
+    def worst_case(self, C_final):
+        ''' Highest concentration per well over the flowlines with a
+            non-zero weight (NaN for wells without flowlines). '''
+        C_final = self._check(C_final)
+        values = C_final[self.weights.indices]
+        worst = np.full((self.n_wells,) + C_final.shape[1:], np.nan)
+        nonempty = np.diff(self.weights.indptr) > 0
+        if nonempty.any():
+            starts = self.weights.indptr[:-1][nonempty]
+            worst[nonempty] = np.maximum.reduceat(values, starts, axis = 0)
+        return worst
+
+    def percentile(self, C_final, q):
+        ''' Flow weighted percentile 'q' (0-100) of the flowline
+            concentrations per well: the lowest concentration for which the
+            cumulative weight of the flowlines with a concentration up to it
+            reaches q % of the well flow (NaN for wells without flowlines).
+        '''
+        C_final = self._check(C_final)
+        if C_final.ndim > 1:
+            return np.stack([self.percentile(C_final[:, j], q)
+                             for j in range(C_final.shape[1])], axis = 1)
+
+        values = C_final[self.weights.indices]
+        order = np.lexsort((values, self._row))
+        values, row = values[order], self._row[order]
+        weight = self.weights.data[order]
+
+        # cumulative weight fraction within each well, offset by the well
+        # index so that the keys increase over all wells
+        cumulative = np.cumsum(weight)
+        start = self.weights.indptr[:-1]
+        offset = np.concatenate([[0.], cumulative])[start]
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            fraction = (cumulative - offset[row]) / self.well_flow[row]
+        keys = row + fraction
+
+        result = np.full(self.n_wells, np.nan)
+        nonempty = np.diff(self.weights.indptr) > 0
+        wells = np.flatnonzero(nonempty)
+        index = np.searchsorted(keys, wells + q / 100., side = 'left')
+        # guard against rounding of the cumulative fraction at the well end
+        index = np.minimum(index, self.weights.indptr[1:][wells] - 1)
+        result[wells] = values[index]
+        return result
+
+    def summary(self, C_final, conc_start = 1., percentiles = (50., 95.)):
+        ''' DataFrame per well with the flow, mixed concentration and log
+            removal, worst-case concentration and flow weighted percentiles. '''
+        df = pd.DataFrame({"well_flow": self.well_flow,
+                           "wellfield": self.wellfield_index,
+                           "C_mixed": self.mixed_concentration(C_final),
+                           "log_removal": self.log_removal(C_final, conc_start),
+                           "C_worst_case": self.worst_case(C_final)})
+        for q in percentiles:
+            df["C_p%g" % q] = self.percentile(C_final, q)
+        return df
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from WADI.removal_functions import REDOX_ZONES
+
+# Ranges (low, high) of the uniformly distributed random flowline inputs
+FLOWLINE_RANGES = {"grainsize": (0.0001, 0.002),
+                   "pH": (6., 8.5),
+                   "temp_water": (2., 25.),
+                   "distance_traveled": (1., 100.),
+                   "traveltime": (10., 1000.)}
+
+
+@pytest.fixture
+def random_flowlines():
+    ''' Factory of random flowline inputs (one value per flowline) for the
+        vectorized removal functions: random_flowlines(n, seed, **ranges),
+        with (low, high) ranges overriding FLOWLINE_RANGES. '''
+    def make(n = 1000, seed = 1, **ranges):
+        rng = np.random.default_rng(seed)
+        flowlines = {"redox": rng.choice(REDOX_ZONES, n)}
+        for name, (low, high) in dict(FLOWLINE_RANGES, **ranges).items():
+            flowlines[name] = rng.uniform(low, high, n)
+        return flowlines
+    return make
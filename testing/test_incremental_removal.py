@@ -0,0 +1,100 @@
+
+import numpy as np
+import pytest
+
+import WADI.removal_functions as rf
+from WADI.incremental_removal import IncrementalMicrobialRemoval
+
+
+def test_incremental_matches_removal_function(random_flowlines, organism_name = "solanacearum"):
+    ''' All terms agree with 'calc_advective_microbial_removal'. '''
+    flowlines = random_flowlines()
+    incremental = IncrementalMicrobialRemoval(organism_name, **flowlines)
+
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    C_final = mbo_removal.calc_advective_microbial_removal(**flowlines)
+
+    np.testing.assert_allclose(incremental.C_final, C_final, rtol = 1e-13)
+    np.testing.assert_allclose(incremental.lamda, mbo_removal.lamda, rtol = 1e-13)
+    np.testing.assert_allclose(incremental.k_att, mbo_removal.k_att, rtol = 1e-13)
+
+
+def test_incremental_update_rows_and_subgraph(random_flowlines, organism_name = "carotovorum"):
+    ''' Updating a subset of rows only recomputes the dependent terms and
+        gives the same result as a full evaluation. '''
+    flowlines = random_flowlines()
+    incremental = IncrementalMicrobialRemoval(organism_name, **flowlines)
+    D_BM = incremental.values['D_BM'].copy()
+
+    rows = np.arange(0, 1000, 3)
+    recomputed = incremental.update(rows = rows, pH = 6.8)
+    assert recomputed == ['alpha', 'k_coll', 'k_att', 'lamda', 'C_final']
+    assert np.array_equal(incremental.values['D_BM'], D_BM)
+
+    flowlines["pH"][rows] = 6.8
+    expected = IncrementalMicrobialRemoval(organism_name, **flowlines)
+    np.testing.assert_array_equal(incremental.C_final, expected.C_final)
+
+    # redox changes re-resolve the organism parameters of those rows
+    incremental.update(rows = [0, 1], redox = 'deeply_anoxic')
+    flowlines["redox"][[0, 1]] = 'deeply_anoxic'
+    expected = IncrementalMicrobialRemoval(organism_name, **flowlines)
+    np.testing.assert_array_equal(incremental.C_final, expected.C_final)
+
+
+def test_incremental_set_removal_parameter(random_flowlines, organism_name = "solani"):
+    ''' Changing an organism's alpha0 for one redox zone only updates the
+        rows in that zone. '''
+    flowlines = random_flowlines()
+    incremental = IncrementalMicrobialRemoval(organism_name, **flowlines)
+    C_final = incremental.C_final.copy()
+
+    incremental.set_removal_parameter('alpha0', 0.1, redox = 'suboxic')
+
+    suboxic = flowlines["redox"] == 'suboxic'
+    assert np.array_equal(incremental.C_final[~suboxic], C_final[~suboxic])
+    expected = rf.MicrobialRemoval(organism = organism_name, alpha0_suboxic = 0.1)
+    np.testing.assert_allclose(incremental.C_final,
+                               expected.calc_advective_microbial_removal(**flowlines),
+                               rtol = 1e-13)
+
+    with pytest.raises(ValueError):
+        incremental.update(porosity = 0.3)
+
+
+def test_incremental_shared_removal_object(organism_name = "solani"):
+    ''' A changed removal parameter does not leak into the removal object
+        (and other incremental removals sharing it). '''
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    alpha0 = mbo_removal.removal_parameters['alpha0']['suboxic']
+    first = IncrementalMicrobialRemoval(mbo_removal, redox = 'anoxic')
+    second = IncrementalMicrobialRemoval(mbo_removal, redox = ['anoxic', 'anoxic'])
+
+    first.set_removal_parameter('alpha0', 0.5, redox = 'suboxic')
+    second.update(rows = [1], redox = 'suboxic')
+
+    assert mbo_removal.removal_parameters['alpha0']['suboxic'] == alpha0
+    np.testing.assert_array_equal(second.values['alpha0'], [
+        mbo_removal.removal_parameters['alpha0']['anoxic'], alpha0])
+    np.testing.assert_allclose(second.C_final,
+                               rf.MicrobialRemoval(organism = organism_name)
+                               .calc_advective_microbial_removal(redox = np.array(['anoxic', 'suboxic'])),
+                               rtol = 1e-13)
+
+
+def test_incremental_temperature_dependent_inactivation(random_flowlines, organism_name = "carotovorum"):
+    ''' A changed Q10 only recomputes the inactivation dependent terms. '''
+    flowlines = random_flowlines()
+    incremental = IncrementalMicrobialRemoval(organism_name, mu1_temp_ref = 10., **flowlines)
+    lamda = incremental.lamda.copy()
+
+    recomputed = incremental.set_removal_parameter('mu1_Q10', 2.5)
+    assert recomputed == ['mu1_temp', 'lamda', 'C_final']
+
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name,
+                                      mu1_temp_ref = 10., mu1_Q10 = 2.5)
+    np.testing.assert_allclose(incremental.C_final,
+                               mbo_removal.calc_advective_microbial_removal(**flowlines),
+                               rtol = 1e-13)
+    np.testing.assert_allclose(incremental.lamda, mbo_removal.lamda, rtol = 1e-13)
+    assert not np.allclose(incremental.lamda, lamda)
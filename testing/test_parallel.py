@@ -0,0 +1,86 @@
+
+import numpy as np
+import pytest
+
+import WADI.removal_functions as rf
+from WADI import parallel
+from WADI.wellfield import WellFieldAggregation
+
+
+def test_row_streams_independent_of_chunking():
+    ''' The samples of a row only depend on the seed and the row ID. '''
+    row_id = np.arange(100)
+    samples = parallel.sample_normal(42, row_id, 0., 1., 10)
+    np.testing.assert_array_equal(parallel.sample_normal(42, row_id[37:], 0., 1., 10),
+                                  samples[37:])
+    np.testing.assert_array_equal(parallel.sample_normal(42, row_id[::-1], 0., 1., 10),
+                                  samples[::-1])
+    assert not np.array_equal(parallel.sample_normal(43, row_id, 0., 1., 10), samples)
+
+
+def test_monte_carlo_chunk_and_worker_invariance(random_flowlines, organism_name = "solani"):
+    ''' Bitwise identical Monte Carlo results for any chunk size and number
+        of workers, also after aggregation to wells. '''
+    flowlines = random_flowlines(n = 200, seed = 5, distance_traveled = (0.1, 2.),
+                                 traveltime = (1., 20.))
+    reference = parallel.check_chunk_invariance(
+        parallel.monte_carlo_microbial_removal, flowlines,
+        chunk_sizes = (1, 13, 64), n_workers = (1, 3),
+        organism = organism_name, seed = 2022, n_samples = 50)
+
+    assert reference["C_final_mean"].shape == (200,)
+    assert (reference["C_final_p5"] <= reference["C_final_p95"]).all()
+
+    # without mu1 variation the samples equal the deterministic result
+    deterministic = parallel.monte_carlo_microbial_removal(
+        np.arange(200), organism = organism_name, mu1_std = 0., n_samples = 3, **flowlines)
+    C_final = rf.MicrobialRemoval(organism = organism_name).calc_advective_microbial_removal(**flowlines)
+    np.testing.assert_allclose(deterministic["C_final_mean"], C_final, rtol = 1e-12)
+
+    wellfield = WellFieldAggregation.from_flowlines(np.arange(200) % 7)
+    chunked = parallel.run_chunked(parallel.monte_carlo_microbial_removal, flowlines,
+                                   chunk_size = 9, organism = organism_name,
+                                   seed = 2022, n_samples = 50)
+    np.testing.assert_array_equal(wellfield.mixed_concentration(chunked["C_final_mean"]),
+                                  wellfield.mixed_concentration(reference["C_final_mean"]))
+
+
+def test_check_chunk_invariance_detects_chunk_dependence():
+    def chunk_position(row_id, x):
+        # depends on the position within the chunk: not chunk invariant
+        return {"position": np.arange(len(row_id))}
+
+    with pytest.raises(AssertionError):
+        parallel.check_chunk_invariance(chunk_position, {"x": np.zeros(10)},
+                                        chunk_sizes = (3,), n_workers = (1,))
+
+
+def test_exact_sum_order_independent():
+    values = np.random.default_rng(0).lognormal(0., 10., 10000)
+    total = parallel.exact_sum(values)
+    assert parallel.exact_sum(values[::-1]) == total
+    assert parallel.exact_sum(np.random.default_rng(1).permutation(values)) == total
+    np.testing.assert_array_equal(parallel.exact_sum(values.reshape(100, 100), axis = 0),
+                                  parallel.exact_sum(values.reshape(100, 100)[::-1], axis = 0))
+
+
+def test_philox_known_answers():
+    ''' Philox4x32-10 known answer vectors (Random123). '''
+    counter = np.array([[0, 0xffffffff, 0x243f6a88],
+                        [0, 0xffffffff, 0x85a308d3],
+                        [0, 0xffffffff, 0x13198a2e],
+                        [0, 0xffffffff, 0x03707344]])
+    key = np.array([[0, 0xffffffff, 0xa4093822],
+                    [0, 0xffffffff, 0x299f31d0]])
+    expected = [[0x6627e8d5, 0x408f276d, 0xd16cfe09],
+                [0xe169c58d, 0x41c83b0e, 0x94fdcceb],
+                [0xbc57ac4c, 0xa20bc7c6, 0x5001e420],
+                [0x9b00dbd8, 0x6d5451fd, 0x24126ea1]]
+    np.testing.assert_array_equal(parallel.philox4x32(counter, key), expected)
+
+
+def test_sample_normal_moments():
+    samples = parallel.sample_normal(7, np.arange(1000), 2., 0.5, 101)
+    assert samples.shape == (1000, 101)
+    assert abs(samples.mean() - 2.) < 0.01
+    assert abs(samples.std() - 0.5) < 0.01
@@ -207,4 +207,96 @@ def test_manual_input_mbo_removal(organism_name = "MS2"):
     assert round(lamda,4) == round(0.7993188853572424 + mu1,4) 
 
     assert round(C_final,3) == round(6.531818379725895e-42,3)
-    
\ No newline at end of file
+    
+
+def test_vectorized_mbo_removal(organism_name = "carotovorum"):
+    '''
+    Verify that arrays of flowlines (incl. mixed redox zones) give the same
+    result as the scalar calculation per flowline.
+    '''
+    redox = np.array(['suboxic', 'anoxic', 'deeply_anoxic', 'anoxic'])
+    grainsize = np.array([0.00025, 0.0005, 0.001, 0.00025])
+    pH_water = np.array([7.5, 7.0, 8.0, 6.5])
+    distance_traveled = np.array([1., 5., 10., 50.])
+
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    C_final = mbo_removal.calc_advective_microbial_removal(grainsize = grainsize,
+                                            pH = pH_water, redox = redox,
+                                            distance_traveled = distance_traveled,
+                                            traveltime = 100.)
+    lamda = mbo_removal.lamda
+
+    for i in range(len(redox)):
+        C_final_scalar = mbo_removal.calc_advective_microbial_removal(grainsize = grainsize[i],
+                                            pH = pH_water[i], redox = redox[i],
+                                            distance_traveled = distance_traveled[i],
+                                            traveltime = 100.)
+        assert np.isclose(C_final[i], C_final_scalar, rtol = 1e-12, atol = 0.)
+        assert np.isclose(lamda[i], mbo_removal.lamda, rtol = 1e-12)
+
+
+def test_omp_removal_function(substance_name = "benzene"):
+    '''
+    Verify the substance removal (retardation and redox dependent
+    degradation) against a manual calculation, scalar and vectorized.
+    '''
+    por_eff = 0.33
+    solid_density = 2.65
+    fraction_organic_carbon = 0.001
+    traveltime = 100.
+
+    omp_removal = rf.SubstanceRemoval(substance = substance_name)
+    C_final = omp_removal.calc_advective_substance_removal(por_eff = por_eff,
+                                            solid_density = solid_density,
+                                            fraction_organic_carbon = fraction_organic_carbon,
+                                            redox = 'suboxic',
+                                            distance_traveled = 1.,
+                                            traveltime = traveltime)
+
+    retardation = 1 + (1 - por_eff) / por_eff * solid_density * \
+        fraction_organic_carbon * 10**1.92
+    assert round(omp_removal.retardation, 6) == round(retardation, 6)
+    assert np.isclose(C_final, np.exp(-np.log(2) / 10.5 * retardation * traveltime))
+
+    # no degradation under deeply anoxic conditions; user defined half-life
+    redox = np.array(['suboxic', 'deeply_anoxic'])
+    C_final = omp_removal.calc_advective_substance_removal(redox = redox)
+    assert C_final[1] == 1.
+    omp_removal = rf.SubstanceRemoval(substance = substance_name,
+                                      omp_half_life_deeply_anoxic = 100.)
+    C_final_user = omp_removal.calc_advective_substance_removal(redox = redox)
+    assert C_final_user[0] == C_final[0]
+    assert C_final_user[1] < 1.
+
+
+def test_temperature_dependent_inactivation(organism_name = "solani"):
+    '''
+    Verify the Q10 temperature correction of mu1 and the batched seasonal
+    calculation (days x flowlines).
+    '''
+    # no reference temperature/Q10 in the database: no correction
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    mbo_removal.calc_advective_microbial_removal(redox = 'suboxic', temp_water = 2.)
+    assert mbo_removal.mu1_temp == 1.2472
+
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name,
+                                      mu1_temp_ref = 12., mu1_Q10 = 2.)
+    mbo_removal.calc_advective_microbial_removal(redox = 'suboxic', temp_water = 2.)
+    assert np.isclose(mbo_removal.mu1_temp, 1.2472 / 2.)
+    mbo_removal.calc_advective_microbial_removal(redox = 'suboxic', temp_water = 12.)
+    assert np.isclose(mbo_removal.mu1_temp, 1.2472)
+
+    # a year of daily temperatures x flowlines in one call
+    temp_water = 13.5 + 11.5 * np.sin(np.arange(365) / 365. * 2 * np.pi)
+    redox = np.array(['suboxic', 'anoxic', 'deeply_anoxic', 'anoxic'])
+    distance_traveled = np.array([1., 2., 5., 10.])
+    C_final = mbo_removal.calc_seasonal_microbial_removal(temp_water, redox = redox,
+                                            distance_traveled = distance_traveled,
+                                            traveltime = 5.)
+    assert C_final.shape == (365, 4)
+    for day in [0, 100, 250]:
+        C_final_day = mbo_removal.calc_advective_microbial_removal(temp_water = temp_water[day],
+                                            redox = redox,
+                                            distance_traveled = distance_traveled,
+                                            traveltime = 5.)
+        np.testing.assert_allclose(C_final[day], C_final_day, rtol = 1e-12)
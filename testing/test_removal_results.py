@@ -0,0 +1,133 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import WADI.removal_functions as rf
+from WADI.removal_results import RemovalResults, calc_flowline_removal
+from WADI.incremental_removal import IncrementalMicrobialRemoval
+
+
+def _results(organism_name, redox, traveltime = 100., offset = 0):
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    C_final = mbo_removal.calc_advective_microbial_removal(redox = redox,
+                                                           traveltime = traveltime)
+    return RemovalResults.from_removal(mbo_removal, C_final, redox, traveltime,
+                                       flowline_id = offset + np.arange(len(redox)))
+
+
+def test_results_from_removal():
+    ''' Columns are typed arrays; the log removal follows from lambda. '''
+    redox = np.array(['suboxic', 'anoxic', 'deeply_anoxic'])
+    results = _results("carotovorum", redox, traveltime = 5.)
+
+    assert len(results) == 3
+    assert results['k_att'].dtype == np.float64
+    assert results['redox_code'].tolist() == [0, 1, 2]
+    np.testing.assert_allclose(results['log_removal'],
+                               -np.log10(results['C_final']), rtol = 1e-10)
+
+    df = results.to_pandas()
+    assert df['redox'].tolist() == list(redox)
+    assert (df['organism'] == "carotovorum").all()
+
+
+def test_results_log_removal_background_concentration():
+    ''' With a background concentration the log removal follows from C_final;
+        without it, from lambda (also where C_final underflows to 0). '''
+    mbo_removal = rf.MicrobialRemoval(organism = "carotovorum")
+    conc_gw = np.array([0., 0.1, 0.])
+    traveltime = np.array([5., 5., 1.e4])
+    C_final = mbo_removal.calc_advective_microbial_removal(conc_gw = conc_gw,
+                                                           traveltime = traveltime)
+    results = RemovalResults.from_removal(mbo_removal, C_final, 'anoxic', traveltime,
+                                          conc_gw = conc_gw)
+
+    assert C_final[2] == 0.
+    np.testing.assert_allclose(results['log_removal'][:2], -np.log10(C_final[:2]),
+                               rtol = 1e-10)
+    np.testing.assert_allclose(results['log_removal'][2],
+                               results['lambda'][2] * traveltime[2] / np.log(10.))
+    # limited by the background concentration: log10(1 / 0.1)
+    assert results['log_removal'][1] <= 1.
+    assert results['log_removal'][1] < results['lambda'][1] * traveltime[1] / np.log(10.)
+
+
+def test_results_concat_remaps_organisms():
+    ''' Concatenating chunks merges the organism codes. '''
+    first = _results("solani", np.array(['anoxic', 'suboxic']))
+    second = _results("carotovorum", np.array(['anoxic']), offset = 2)
+    third = _results("solani", np.array(['suboxic']), offset = 3)
+
+    results = RemovalResults.concat([first, second, third])
+    assert results.organisms == ["solani", "carotovorum"]
+    assert results['organism_code'].tolist() == [0, 0, 1, 0]
+    assert results['flowline_id'].tolist() == [0, 1, 2, 3]
+    assert len(RemovalResults.concat([])) == 0
+
+
+def test_incremental_to_results():
+    incremental = IncrementalMicrobialRemoval("solanacearum", pH = [6.5, 7.5, 8.5])
+    results = incremental.to_results()
+    np.testing.assert_array_equal(results['C_final'], incremental.C_final)
+    assert results.organisms == ["solanacearum"]
+
+
+def test_results_arrow_parquet(tmp_path):
+    ''' Numeric columns are exported without copying. '''
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    results = _results("solani", np.array(['anoxic', 'suboxic', 'anoxic']))
+    table = results.to_arrow()
+    assert table.column('redox').to_pylist() == ['anoxic', 'suboxic', 'anoxic']
+    assert table.column('organism').to_pylist() == ['solani'] * 3
+    # zero-copy: the arrow buffer points to the numpy data
+    buffer = table.column('C_final').chunk(0).buffers()[1]
+    assert buffer.address == results['C_final'].ctypes.data
+
+    fpath = tmp_path / "results.parquet"
+    results.to_parquet(fpath)
+    np.testing.assert_array_equal(pq.read_table(fpath).column('lambda').to_numpy(),
+                                  results['lambda'])
+
+
+def test_flowline_removal_organisms_and_substances():
+    ''' Pathogens and OMPs over the same flowlines in one results store. '''
+    flowlines = pd.DataFrame({"redox": ['suboxic', 'anoxic', 'deeply_anoxic'],
+                              "pH": [7., 7.5, 8.],
+                              "fraction_organic_carbon": [0.001, 0.002, 0.005],
+                              "distance_traveled": [1., 2., 5.],
+                              "traveltime": [10., 20., 50.]},
+                             index = [10, 11, 12])
+
+    results = calc_flowline_removal(flowlines, organisms = ["solani"],
+                                    substances = ["benzene", "AMPA"])
+
+    assert len(results) == 9
+    assert results.organisms == ["solani", "benzene", "AMPA"]
+    assert results['flowline_id'].tolist() == [10, 11, 12] * 3
+    assert np.isnan(results['k_att'][3:]).all()
+
+    omp_removal = rf.SubstanceRemoval(substance = "AMPA")
+    C_final = omp_removal.calc_advective_substance_removal(
+        redox = flowlines["redox"].values,
+        fraction_organic_carbon = flowlines["fraction_organic_carbon"].values,
+        distance_traveled = flowlines["distance_traveled"].values,
+        traveltime = flowlines["traveltime"].values)
+    np.testing.assert_array_equal(results['C_final'][6:], C_final)
+
+
+def test_flowline_removal_string_labels():
+    ''' Flowline labels other than integers are kept, also after concat. '''
+    flowlines = pd.DataFrame({"redox": ['suboxic', 'anoxic'],
+                              "traveltime": [10., 20.]},
+                             index = ["well1-a", "well2-b"])
+
+    results = calc_flowline_removal(flowlines, organisms = ["solani", "carotovorum"])
+    assert results['flowline_id'].dtype == np.int64
+    assert list(results.flowline_label) == ["well1-a", "well2-b"] * 2
+    assert results.to_pandas()['flowline_id'].tolist() == ["well1-a", "well2-b"] * 2
+
+    combined = RemovalResults.concat([_results("solani", np.array(['anoxic'])), results])
+    assert list(combined.flowline_label) == [0] + ["well1-a", "well2-b"] * 2
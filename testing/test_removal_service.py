@@ -0,0 +1,161 @@
+
+import asyncio
+import json
+
+import numpy as np
+
+import WADI.removal_functions as rf
+import WADI.removal_service as rs
+
+
+def test_batcher_matches_scalar_removal(organism_name = "solani"):
+    ''' Concurrent requests are evaluated in one batch and each get their
+        own (scalar-equivalent) result. '''
+    requests = [{"organism": organism_name, "redox": redox, "pH": pH,
+                 "distance_traveled": distance, "traveltime": 100.}
+                for redox in ["suboxic", "anoxic"]
+                for pH in [6.5, 7.5]
+                for distance in [1., 10.]]
+    # organism parameter override for a single request
+    requests[0]["mu1"] = 0.5
+
+    async def run():
+        async with rs.RemovalBatcher(batch_window = 0.05) as batcher:
+            results = await asyncio.gather(*[batcher.submit(req) for req in requests])
+            return results, batcher.metrics.summary()
+
+    results, metrics = asyncio.run(run())
+
+    assert metrics["n_requests"] == len(requests)
+    assert metrics["n_batches"] == 1
+    assert metrics["latency_p99_ms"] >= metrics["latency_p50_ms"]
+
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    for req, res in zip(requests, results):
+        kwargs = {k: v for k, v in req.items() if k != "organism"}
+        C_final = mbo_removal.calc_advective_microbial_removal(**kwargs)
+        assert np.isclose(res["C_final"], C_final, rtol = 1e-12, atol = 0.)
+        assert np.isclose(res["lambda"], mbo_removal.lamda, rtol = 1e-12)
+
+
+def test_batcher_isolates_invalid_requests():
+    ''' A faulty request fails on its own without failing its batch. '''
+    requests = [{"organism": "carotovorum"},
+                {"organism": "carotovorum", "redox": "oxic"},
+                {"organism": "carotovorum", "porosity": 0.3},
+                {"organism": "MS2"},
+                {"organism": "carotovorum", "substance": "benzene"}]
+
+    async def run():
+        async with rs.RemovalBatcher(batch_window = 0.05) as batcher:
+            return await asyncio.gather(*[batcher.submit(req) for req in requests],
+                                        return_exceptions = True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], dict)
+    for res in results[1:]:
+        assert isinstance(res, ValueError)
+
+
+def test_batcher_survives_malformed_requests():
+    ''' Malformed and cancelled requests do not stop the batching loop. '''
+    async def run():
+        async with rs.RemovalBatcher(batch_window = 0.01) as batcher:
+            bad = await asyncio.gather(batcher.submit(1),
+                                       batcher.submit({"organism": ["x"]}),
+                                       return_exceptions = True)
+            # a requester that gives up before its batch is evaluated
+            cancelled = asyncio.ensure_future(batcher.submit({"organism": "solani"}))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            good = await asyncio.wait_for(batcher.submit({"organism": "carotovorum"}), 5.)
+            return bad, good
+
+    bad, good = asyncio.run(run())
+    assert all(isinstance(res, ValueError) for res in bad)
+    assert "C_final" in good
+
+
+def test_batcher_stop_cancels_open_batch():
+    ''' Requests waiting in an open batch window are cancelled on stop. '''
+    async def run():
+        batcher = rs.RemovalBatcher(batch_window = 0.5)
+        pending = asyncio.ensure_future(batcher.submit({"organism": "solani"}))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(pending, return_exceptions = True), 5.)
+
+    result, = asyncio.run(run())
+    assert isinstance(result, asyncio.CancelledError)
+
+
+def test_removal_service_http():
+    ''' Round trip over HTTP (keep-alive) incl. the metrics route. '''
+    async def request(reader, writer, method, target, payload = None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        writer.write(("%s %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+                      % (method, target, len(body))).encode() + body)
+        await writer.drain()
+        status = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+        data = await reader.readexactly(int(headers["content-length"]))
+        return status.decode().split(" ")[1], json.loads(data)
+
+    async def run():
+        service = rs.RemovalService(rs.RemovalBatcher(batch_window = 0.001))
+        server = await service.serve(port = 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        single = await request(reader, writer, "POST", "/removal", {"organism": "carotovorum"})
+        many = await request(reader, writer, "POST", "/removal",
+                             [{"organism": "carotovorum"}, {"organism": "solani", "pH": 7.}])
+        metrics = await request(reader, writer, "GET", "/metrics")
+        missing = await request(reader, writer, "GET", "/unknown")
+        malformed = await request(reader, writer, "POST", "/removal", [1])
+        after = await request(reader, writer, "POST", "/removal", {"organism": "solani"})
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        await service.batcher.stop()
+        return single, many, metrics, missing, malformed, after
+
+    single, many, metrics, missing, malformed, after = asyncio.run(run())
+
+    C_final = rf.MicrobialRemoval(organism = "carotovorum").calc_advective_microbial_removal()
+    assert single[0] == "200"
+    assert np.isclose(single[1]["C_final"], C_final, rtol = 1e-12)
+    assert many[0] == "200" and len(many[1]) == 2
+    assert metrics[1]["n_requests"] == 3
+    assert missing[0] == "404"
+    assert "error" in malformed[1][0]
+    assert after[0] == "200"
+
+
+def test_batcher_mixed_organisms_and_substances():
+    ''' Organism and substance requests share one batch. '''
+    requests = [{"organism": "solani", "redox": "suboxic"},
+                {"substance": "benzene", "redox": "suboxic"},
+                {"substance": "AMPA", "fraction_organic_carbon": 0.01},
+                {"substance": "benzene", "redox": "anoxic", "log_Koc": 3.}]
+
+    async def run():
+        async with rs.RemovalBatcher(batch_window = 0.05) as batcher:
+            results = await asyncio.gather(*[batcher.submit(req) for req in requests])
+            return results, batcher.metrics.summary()
+
+    results, metrics = asyncio.run(run())
+    assert metrics["n_batches"] == 1
+    assert "k_att" in results[0]
+
+    for req, res in zip(requests[1:], results[1:]):
+        omp_removal = rf.SubstanceRemoval(substance = req["substance"])
+        kwargs = {k: v for k, v in req.items() if k != "substance"}
+        C_final = omp_removal.calc_advective_substance_removal(**kwargs)
+        assert np.isclose(res["C_final"], C_final, rtol = 1e-12, atol = 0.)
+        assert np.isclose(res["retardation"], omp_removal.retardation, rtol = 1e-12)
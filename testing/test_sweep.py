@@ -0,0 +1,87 @@
+
+import itertools
+
+import numpy as np
+
+import WADI.removal_functions as rf
+from WADI.sweep import ScenarioSweep
+
+
+def _sweep(block_size = 7):
+    return ScenarioSweep(organism = ["solani", "carotovorum"],
+                         redox = ["suboxic", "anoxic"],
+                         grainsize = [0.00025, 0.001],
+                         por_eff = [0.3, 0.35],
+                         pH = [6.5, 7.5],
+                         temp_water = [5., 15.],
+                         porewater_velocity = [0.1, 1.],
+                         distance_traveled = [0.5, 2., 1., 5., 10.],
+                         block_size = block_size)
+
+
+def test_sweep_matches_removal_function():
+    ''' Streamed log removal equals the removal function per scenario. '''
+    sweep = _sweep()
+    assert sweep.shape == (2, 2, 2, 2, 2, 2, 2, 5)
+    distances = sweep.axes['distance_traveled']
+    assert list(distances) == [0.5, 1., 2., 5., 10.]
+
+    log_removal = np.concatenate([block['log_removal'] for block in sweep.iter_log_removal()])
+    assert log_removal.shape == (128, 5)
+
+    combinations = itertools.product(*[sweep.axes[name] for name in
+                                       ('organism', 'redox', 'grainsize', 'por_eff',
+                                        'pH', 'temp_water', 'porewater_velocity')])
+    for i, (organism, redox, grainsize, por_eff, pH, temp_water, v_por) in enumerate(combinations):
+        mbo_removal = rf.MicrobialRemoval(organism = organism)
+        traveltime = distances[1] / v_por
+        C_final = mbo_removal.calc_advective_microbial_removal(grainsize = grainsize,
+                                            por_eff = por_eff, pH = pH,
+                                            temp_water = temp_water, redox = redox,
+                                            distance_traveled = distances[1],
+                                            traveltime = traveltime)
+        # log10(C0/C), also where C_final underflows
+        expected = mbo_removal.lamda * traveltime / np.log(10.)
+        assert np.isclose(log_removal[i, 1], expected, rtol = 1e-10)
+        if C_final > 0.:
+            assert np.isclose(log_removal[i, 1], -np.log10(C_final), rtol = 1e-8)
+
+
+def test_sweep_feasible_region():
+    ''' The shortest distance follows directly from the log removal per meter. '''
+    target = 4.
+    region = _sweep().feasible_region(target)
+    assert region.min_distance_index.shape == (2, 2, 2, 2, 2, 2, 2)
+
+    log_removal = np.concatenate([block['log_removal'] for block in _sweep().iter_log_removal()])
+    met = log_removal >= target
+    expected = np.where(met.any(axis = 1), met.argmax(axis = 1), -1)
+    np.testing.assert_array_equal(region.min_distance_index.ravel(), expected)
+    assert 0. < region.fraction_feasible < 1.
+
+    # target met exactly at a distance
+    exact = _sweep().feasible_region(log_removal[0, 2])
+    assert exact.min_distance_index.ravel()[0] == 2
+
+    # independent of the block size
+    np.testing.assert_array_equal(_sweep(block_size = 1000).feasible_region(target).min_distance_index,
+                                  region.min_distance_index)
+
+    df = region.to_frame()
+    assert len(df) == (expected >= 0).sum()
+    assert (df['min_distance'] > 0).all()
+    assert set(df['organism']) <= {"solani", "carotovorum"}
+
+
+def test_sweep_feasible_region_many_distances():
+    ''' The index type grows with the number of distances. '''
+    distances = np.linspace(1.e-7, 0.01, 70000)
+    sweep = ScenarioSweep(distance_traveled = distances)
+    region = sweep.feasible_region(4.)
+    assert region.min_distance_index.dtype == np.int32
+
+    log_removal = np.concatenate([block['log_removal'] for block in sweep.iter_log_removal()])
+    met = log_removal >= 4.
+    np.testing.assert_array_equal(region.min_distance_index.ravel(),
+                                  np.where(met.any(axis = 1), met.argmax(axis = 1), -1))
+    assert (region.min_distance_index > np.iinfo(np.int16).max).any()
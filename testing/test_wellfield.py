@@ -0,0 +1,78 @@
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+import WADI.removal_functions as rf
+from WADI.wellfield import WellFieldAggregation
+
+
+def _wellfield(n_wells = 50, n_flowlines = 2000, seed = 3):
+    rng = np.random.default_rng(seed)
+    # flowlines shared between wells, random weights
+    well = rng.integers(0, n_wells - 1, size = 2 * n_flowlines)   # last well: no flowlines
+    flowline = np.tile(np.arange(n_flowlines), 2)
+    weight = rng.uniform(0.1, 10., size = 2 * n_flowlines)
+    weights = sparse.coo_matrix((weight, (well, flowline)), shape = (n_wells, n_flowlines))
+    return weights.toarray(), rng.uniform(0., 1., n_flowlines)
+
+
+def test_wellfield_matches_loop_over_wells():
+    dense, C_final = _wellfield()
+    wellfield = WellFieldAggregation(sparse.csr_matrix(dense),
+                                     wellfield_index = np.arange(50) // 25)
+
+    C_mixed = wellfield.mixed_concentration(C_final)
+    worst = wellfield.worst_case(C_final)
+    p95 = wellfield.percentile(C_final, 95.)
+    for i in range(49):
+        w = dense[i]
+        assert np.isclose(C_mixed[i], (w * C_final).sum() / w.sum())
+        assert worst[i] == C_final[w > 0].max()
+        order = np.argsort(C_final[w > 0])
+        cumulative = np.cumsum(w[w > 0][order]) / w.sum()
+        assert p95[i] == C_final[w > 0][order][np.searchsorted(cumulative, 0.95)]
+    assert np.isnan(worst[49]) and np.isnan(p95[49])
+    assert (wellfield.percentile(C_final, 100.)[:49] == worst[:49]).all()
+
+    flow = dense.sum(axis = 1)
+    C_wellfield = wellfield.wellfield_concentration(C_final)
+    assert np.isclose(C_wellfield[0], (flow[:25] * C_mixed[:25]).sum() / flow[:25].sum())
+    np.testing.assert_allclose(wellfield.log_removal(C_final)[:49], -np.log10(C_mixed[:49]))
+
+    # a well without flowlines reports NaN, without affecting its well field
+    assert np.isnan(C_mixed[49]) and np.isnan(wellfield.log_removal(C_final)[49])
+    assert np.isnan(wellfield.summary(C_final)['C_mixed'][49])
+    assert np.isclose(C_wellfield[1], (flow[25:49] * C_mixed[25:49]).sum() / flow[25:49].sum())
+    # as does a well field without flow
+    wellfield = WellFieldAggregation(sparse.csr_matrix(dense),
+                                     wellfield_index = np.r_[np.zeros(49, dtype = int), 1])
+    assert np.isnan(wellfield.wellfield_concentration(C_final)[1])
+
+
+def test_wellfield_from_removal_results(organism_name = "solani"):
+    ''' Flowline results to per well log removal, also for a 2D (seasonal)
+        flowline result. '''
+    rng = np.random.default_rng(0)
+    n_flowlines = 300
+    mbo_removal = rf.MicrobialRemoval(organism = organism_name)
+    C_final = mbo_removal.calc_advective_microbial_removal(
+        redox = rng.choice(['suboxic', 'anoxic'], n_flowlines),
+        distance_traveled = rng.uniform(0.1, 1., n_flowlines), traveltime = 1.)
+
+    wellfield = WellFieldAggregation.from_flowlines(rng.integers(0, 10, n_flowlines),
+                                                    weight = rng.uniform(1., 5., n_flowlines))
+    df = wellfield.summary(C_final)
+    assert len(df) == 10
+    assert (df["C_worst_case"] >= df["C_mixed"]).all()
+    assert (df["log_removal"] > 0).all()
+
+    C_2d = np.stack([C_final, C_final / 10.], axis = 1)
+    C_mixed = wellfield.mixed_concentration(C_2d)
+    assert C_mixed.shape == (10, 2)
+    np.testing.assert_allclose(C_mixed[:, 1], C_mixed[:, 0] / 10.)
+    np.testing.assert_array_equal(wellfield.worst_case(C_2d)[:, 0], df["C_worst_case"])
+    np.testing.assert_array_equal(wellfield.percentile(C_2d, 50.)[:, 0], df["C_p50"])
+
+    with pytest.raises(ValueError):
+        wellfield.mixed_concentration(C_final[:-1])